@@ -0,0 +1,145 @@
+"""
+Admission Control Module
+Bounded queue for cold certificate renders and per-client rate limits
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Seconds per render assumed until the first render is measured
+_INITIAL_RENDER_SECONDS = 0.5
+# Weight of the newest render time in the moving average
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """The render queue is full; the client should retry later."""
+
+    def __init__(self, retry_after: int, estimated_wait: float):
+        super().__init__(f"Render queue is full; estimated wait {estimated_wait:.1f}s")
+        self.retry_after = retry_after
+        self.estimated_wait = estimated_wait
+
+
+class RenderAdmission:
+    """Caps renders running plus queued in this worker, and estimates the wait from recent render times."""
+
+    def __init__(self, concurrency: int, max_queue: int):
+        """
+        Initialize admission control
+
+        Args:
+            concurrency: Renders that run at once (the render thread pool size)
+            max_queue: Renders allowed to wait for a thread (0 = unbounded)
+        """
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        # Admitted renders not finished yet (running + queued); event loop only
+        self.pending = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._render_seconds = _INITIAL_RENDER_SECONDS
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> Optional[int]:
+        return self.concurrency + self.max_queue if self.max_queue else None
+
+    def estimated_wait(self) -> float:
+        """Seconds until a render admitted now would finish."""
+        rounds = self.pending // self.concurrency + 1
+        return rounds * self._render_seconds
+
+    def admit(self) -> None:
+        """
+        Reserve a slot for one render (call from the event loop)
+
+        Raises:
+            AdmissionRejected: If the queue is full
+        """
+        capacity = self.capacity
+        if capacity is not None and self.pending >= capacity:
+            self.rejected += 1
+            wait = self.estimated_wait()
+            raise AdmissionRejected(retry_after=max(1, math.ceil(wait)), estimated_wait=wait)
+        self.pending += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        """Free the slot of a finished render (call from the event loop)."""
+        self.pending = max(0, self.pending - 1)
+
+    def observe(self, seconds: float) -> None:
+        """Feed the duration of a render into the wait estimate (any thread)."""
+        with self._lock:
+            self._render_seconds += _EWMA_ALPHA * (seconds - self._render_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue occupancy and counters for /health."""
+        return {
+            "pending": self.pending,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_render_seconds": round(self._render_seconds, 3),
+            "estimated_wait_seconds": round(self.estimated_wait(), 2),
+        }
+
+
+class RateLimiter:
+    """Token bucket per client: up to `per_minute` requests at once, refilled continuously."""
+
+    def __init__(self, per_minute: int, max_clients: int = 100_000):
+        """
+        Initialize the limiter
+
+        Args:
+            per_minute: Requests allowed per client per minute (0 = unlimited)
+            max_clients: Clients tracked at once; the least recently seen are forgotten
+        """
+        self.per_minute = max(0, per_minute)
+        self.max_clients = max_clients
+        self.limited = 0
+        # client -> [tokens, last refill (monotonic)]; most recently seen last
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    def check(self, client: str) -> float:
+        """
+        Take one request token for a client
+
+        Args:
+            client: Client key (e.g. IP address)
+
+        Returns:
+            0.0 if the request may proceed, else seconds until it would
+        """
+        if not self.per_minute:
+            return 0.0
+
+        now = time.monotonic()
+        rate = self.per_minute / 60.0
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [float(self.per_minute), now]
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(float(self.per_minute), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            self.limited += 1
+            return (1.0 - bucket[0]) / rate
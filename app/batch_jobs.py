@@ -0,0 +1,313 @@
+"""
+Batch Jobs Module
+Runs bulk certificate generation in the background on a process pool
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.certificate_generator import CertificateGenerator
+from app.template_registry import TemplateRegistry
+
+
+class RenderTask(NamedTuple):
+    """One certificate to render."""
+
+    name: str
+    certificate_id: str
+    # Event code, selects the template through the TemplateRegistry
+    code: str = ""
+    # Content of the verification QR code ("" for none)
+    qr_data: str = ""
+
+
+# (template_path, output_dir, pdf_engine, layout overrides, event code) --
+# everything a worker needs to rebuild an equivalent generator
+GeneratorSpec = Tuple[str, str, Optional[str], Tuple[Tuple[str, str], ...], str]
+
+# Per-process generators, so pool workers reuse the decoded template and fonts
+_worker_generators: Dict[GeneratorSpec, CertificateGenerator] = {}
+
+
+def _generator_spec(generator: CertificateGenerator) -> GeneratorSpec:
+    return (
+        generator.template_path,
+        generator.output_dir or "",
+        generator.pdf_engine,
+        tuple(sorted(generator.layout_overrides.items())),
+        generator.event_code,
+    )
+
+
+def _render_in_worker(spec: GeneratorSpec, name: str, certificate_id: str, qr_data: str = "") -> str:
+    generator = _worker_generators.get(spec)
+    if generator is None:
+        template_path, output_dir, pdf_engine, layout, event_code = spec
+        generator = CertificateGenerator(
+            template_path=template_path,
+            output_dir=output_dir,
+            pdf_engine=pdf_engine,
+            layout_overrides=dict(layout),
+            event_code=event_code,
+        )
+        _worker_generators[spec] = generator
+    return generator.ensure_certificate(student_name=name, certificate_id=certificate_id, qr_data=qr_data)
+
+
+def default_worker_count() -> int:
+    """Number of pool workers: BATCH_WORKERS, else the CPUs this process may use."""
+    configured = os.getenv("BATCH_WORKERS", "").strip()
+    if configured.isdigit() and int(configured) > 0:
+        return int(configured)
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+class BatchJob:
+    """Progress of one background generation run."""
+
+    def __init__(
+        self,
+        job_id: str,
+        tasks: List[RenderTask],
+        skip_existing: bool,
+        on_finish: Optional[Callable[["BatchJob"], None]] = None,
+    ):
+        self.job_id = job_id
+        self.tasks = tasks
+        self.skip_existing = skip_existing
+        self.on_finish = on_finish
+        # Extra fields reported by to_dict(), e.g. the roster diff of /generate-all
+        self.details: Dict[str, Any] = {}
+        self.status = "pending"
+        self.generated: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: List[Dict[str, str]] = []
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "cancelled", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            generated, skipped, failed = len(self.generated), len(self.skipped), list(self.failed)
+
+        total = len(self.tasks)
+        done = generated + skipped
+        remaining = max(0, total - done - len(failed))
+
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        rendered = generated + len(failed)
+        throughput = rendered / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if not self.finished and throughput > 0:
+            eta = round(remaining / throughput, 1)
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": total,
+            "done": done,
+            "generated": generated,
+            "skipped": skipped,
+            "failed": len(failed),
+            "remaining": remaining,
+            "throughput_per_sec": round(throughput, 2),
+            "eta_seconds": eta,
+            "elapsed_seconds": round(elapsed, 1),
+            "errors": failed,
+            "error": self.error,
+            **self.details,
+        }
+
+
+class BatchJobManager:
+    """Run BatchJobs on a shared process pool, one feeder thread per job."""
+
+    def __init__(
+        self,
+        generator: CertificateGenerator,
+        max_workers: Optional[int] = None,
+        history: int = 20,
+        registry: Optional[TemplateRegistry] = None,
+    ):
+        """
+        Initialize the job manager
+
+        Args:
+            generator: Generator whose template/output settings the workers copy
+            max_workers: Pool size (defaults to default_worker_count())
+            history: Number of finished jobs kept for status queries
+            registry: Per-event templates; tasks with a known code use theirs
+        """
+        self.generator = generator
+        self.registry = registry
+        self.max_workers = max_workers or default_worker_count()
+        self.history = history
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded server process is not safe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def submit(
+        self,
+        tasks: List[RenderTask],
+        skip_existing: bool = True,
+        on_finish: Optional[Callable[[BatchJob], None]] = None,
+    ) -> BatchJob:
+        """
+        Start a background job and return immediately
+
+        Args:
+            tasks: Certificates to render
+            skip_existing: Skip certificates whose cached PDF is current
+            on_finish: Called on the job's thread once it has completed,
+                been cancelled or failed
+
+        Returns:
+            The new job (poll it with get())
+        """
+        job = BatchJob(uuid.uuid4().hex, list(tasks), skip_existing, on_finish)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            finished = [jid for jid, j in self._jobs.items() if j.finished]
+            for jid in finished[: max(0, len(self._jobs) - self.history)]:
+                del self._jobs[jid]
+
+        thread = threading.Thread(target=self._run, args=(job,), name=f"batch-{job.job_id[:8]}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[BatchJob]:
+        """Stop queuing new renders for a job; renders already running finish."""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+        return job
+
+    def _run(self, job: BatchJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            self._feed(job)
+            job.status = "cancelled" if job.cancel_event.is_set() else "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            if isinstance(e, BrokenProcessPool):
+                # A worker died; start a fresh pool for the next job.
+                self._discard_pool()
+        finally:
+            job.finished_at = time.time()
+            if job.on_finish is not None:
+                try:
+                    job.on_finish(job)
+                except Exception as e:
+                    job.error = job.error or f"on_finish: {e}"
+
+    def generator_for(self, task: RenderTask) -> CertificateGenerator:
+        """Generator for a task's event code (the default one without a registry)."""
+        if self.registry is None:
+            return self.generator
+        return self.registry.generator_for(task.code)
+
+    def submit_render(self, task: RenderTask) -> Future:
+        """
+        Render one certificate on the shared pool, outside any job
+
+        Args:
+            task: Certificate to render
+
+        Returns:
+            Future resolving to the PDF path
+        """
+        spec = _generator_spec(self.generator_for(task))
+        try:
+            return self._get_pool().submit(_render_in_worker, spec, task.name, task.certificate_id, task.qr_data)
+        except BrokenProcessPool:
+            self._discard_pool()
+            return self._get_pool().submit(_render_in_worker, spec, task.name, task.certificate_id, task.qr_data)
+
+    def _feed(self, job: BatchJob) -> None:
+        pool = self._get_pool()
+        # Keep the pool busy without queuing the whole roster at once.
+        max_in_flight = self.max_workers * 4
+        in_flight: Dict[Future, RenderTask] = {}
+
+        def collect(done_futures) -> None:
+            for future in done_futures:
+                task = in_flight.pop(future)
+                if future.cancelled():
+                    continue
+                error = future.exception()
+                with job._lock:
+                    if error is None:
+                        job.generated.append(task.certificate_id)
+                    else:
+                        job.failed.append({"certificate_id": task.certificate_id, "error": str(error)})
+
+        for task in job.tasks:
+            if job.cancel_event.is_set():
+                break
+            generator = self.generator_for(task)
+            if job.skip_existing and generator.is_certificate_current(task.name, task.certificate_id, task.qr_data):
+                with job._lock:
+                    job.skipped.append(task.certificate_id)
+                continue
+
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            future = pool.submit(
+                _render_in_worker, _generator_spec(generator), task.name, task.certificate_id, task.qr_data
+            )
+            in_flight[future] = task
+
+        if job.cancel_event.is_set():
+            for future in in_flight:
+                future.cancel()
+
+        if in_flight:
+            done, _ = wait(in_flight)
+            collect(done)
+
+    def _discard_pool(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            job.cancel_event.set()
+        self._discard_pool()
@@ -0,0 +1,308 @@
+"""
+Bulk Export Module
+Streams many certificates as one ZIP archive or one merged PDF, chunk by chunk
+"""
+
+import io
+import logging
+import os
+import time
+import zipfile
+import zlib
+from array import array
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.batch_jobs import BatchJobManager, RenderTask
+from app.certificate_generator import PDF_RESOLUTION
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_certificate_files(
+    tasks: Iterable[RenderTask],
+    jobs: BatchJobManager,
+    window: Optional[int] = None,
+) -> Iterator[Tuple[RenderTask, Optional[str], Optional[str]]]:
+    """
+    Yield each certificate's PDF path, rendering missing ones on the job pool
+
+    Current cached PDFs are yielded immediately; the rest are rendered in
+    parallel and yielded as they finish, so output order is not roster order.
+    At most `window` renders are queued at once.
+
+    Args:
+        tasks: Certificates to export
+        jobs: Job manager whose process pool renders missing PDFs
+        window: Max renders in flight (default: twice the pool size)
+
+    Yields:
+        (task, path, None) on success or (task, None, error) on failure
+    """
+    window = window or jobs.max_workers * 2
+    pending: Dict[Future, RenderTask] = {}
+
+    def finished(done) -> Iterator[Tuple[RenderTask, Optional[str], Optional[str]]]:
+        for future in done:
+            task = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                yield task, future.result(), None
+            else:
+                yield task, None, str(error)
+
+    try:
+        for task in tasks:
+            generator = jobs.generator_for(task)
+            if generator.is_certificate_current(task.name, task.certificate_id, task.qr_data):
+                yield task, generator.get_certificate_path(task.certificate_id), None
+                continue
+
+            while len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+            pending[jobs.submit_render(task)] = task
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+    finally:
+        # Client went away: don't render what nobody will download.
+        for future in pending:
+            future.cancel()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target that hands out what was written since the last take()."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        chunks, self._chunks = self._chunks, []
+        return b"".join(chunks)
+
+
+def stream_zip(files: Iterable[Tuple[RenderTask, Optional[str], Optional[str]]]) -> Iterator[bytes]:
+    """
+    Build a ZIP of certificate PDFs on the fly
+
+    Entries are stored uncompressed (the PDFs are already compressed) and
+    written with data descriptors, so nothing is buffered beyond one chunk.
+    Certificates that failed to render are listed in `errors.txt`.
+
+    Args:
+        files: Output of iter_certificate_files()
+
+    Yields:
+        ZIP bytes
+    """
+    sink = _ChunkSink()
+    errors: List[str] = []
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for task, path, error in files:
+            if path is None:
+                errors.append(f"{task.certificate_id}\t{error}")
+                continue
+            try:
+                src = open(path, "rb")
+            except OSError as e:
+                errors.append(f"{task.certificate_id}\t{e}")
+                continue
+            with src:
+                st = os.fstat(src.fileno())
+                info = zipfile.ZipInfo(f"{task.certificate_id}.pdf", date_time=time.localtime(st.st_mtime)[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = st.st_size
+                with archive.open(info, mode="w") as dest:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield sink.take()
+            yield sink.take()
+
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    yield sink.take()
+
+
+class _PdfWriter:
+    """Sequential PDF object writer; only object offsets are kept in memory."""
+
+    def __init__(self):
+        self.offset = 0
+        # offsets[n - 1] is the byte offset of object n
+        self.offsets = array("Q")
+
+    def reserve(self) -> int:
+        self.offsets.append(0)
+        return len(self.offsets)
+
+    def emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def obj(self, num: int, body: bytes, stream: Optional[bytes] = None) -> bytes:
+        self.offsets[num - 1] = self.offset
+        parts = [b"%d 0 obj\n" % num, body]
+        if stream is not None:
+            parts += [b"\nstream\n", stream, b"\nendstream"]
+        parts.append(b"\nendobj\n")
+        return self.emit(b"".join(parts))
+
+
+def _fmt(value: float) -> bytes:
+    return (b"%.4f" % value).rstrip(b"0").rstrip(b".")
+
+
+# Trailing error pages: US Letter, Helvetica 10pt
+_ERROR_PAGE_SIZE = (612, 792)
+_ERROR_LINES_PER_PAGE = 64
+_ERROR_LINE_CHARS = 110
+
+
+def _pdf_text(text: str) -> bytes:
+    """Encode text as a PDF literal string for a standard Type 1 font."""
+    data = " ".join(text.split())[:_ERROR_LINE_CHARS].encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def stream_merged_pdf(tasks: Iterable[RenderTask], jobs: BatchJobManager) -> Iterator[bytes]:
+    """
+    Build one PDF with a page per certificate, on the fly
+
+    Each template is embedded once and shared by every page that uses it;
+    a page adds only the name, drawn on a small transparent image, and the
+    QR code (if any) as filled rectangles, so pages look the same as the
+    Pillow engine's output. Pages are always drawn this way: the vector
+    engine (CERT_PDF_ENGINE=vector) and its settings are not used here.
+    The per-page work is small and doesn't need the cached PDFs, so nothing
+    is rendered on the pool.
+
+    Certificates that fail are listed on error pages at the end of the
+    document, since the response status has already been sent.
+
+    Args:
+        tasks: Certificates to include, in page order
+        jobs: Job manager (used to pick each task's generator)
+
+    Yields:
+        PDF bytes
+    """
+    pdf = _PdfWriter()
+    scale = 72.0 / PDF_RESOLUTION
+    catalog, pages = pdf.reserve(), pdf.reserve()
+    kids = array("Q")
+    # (template XObject name, stream checksum) -> object number
+    templates: Dict[Tuple[str, int], int] = {}
+    errors: List[str] = []
+
+    yield pdf.emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    for task in tasks:
+        try:
+            xobj, overlay = jobs.generator_for(task).name_overlay(task.name, task.qr_data)
+        except Exception as e:
+            logger.warning("Skipping %s in merged PDF: %s", task.certificate_id, e)
+            errors.append(f"{task.certificate_id}: {e}")
+            continue
+
+        key = (xobj.name, zlib.crc32(xobj.streamContent))
+        template_obj = templates.get(key)
+        if template_obj is None:
+            template_obj = pdf.reserve()
+            templates[key] = template_obj
+            filters = b"".join(b"/" + f.encode("ascii") for f in xobj._filters)
+            yield pdf.obj(
+                template_obj,
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /%s"
+                b" /BitsPerComponent %d /Filter [%s] /Length %d >>"
+                % (xobj.width, xobj.height, xobj.colorSpace.encode("ascii"), xobj.bitsPerComponent,
+                   filters, len(xobj.streamContent)),
+                xobj.streamContent,
+            )
+
+        image = overlay.image
+        ow, oh = image.size
+        color = zlib.compress(image.convert("RGB").tobytes())
+        alpha = zlib.compress(image.getchannel("A").tobytes())
+        mask_obj, name_obj, content_obj, page_obj = pdf.reserve(), pdf.reserve(), pdf.reserve(), pdf.reserve()
+
+        yield pdf.obj(
+            mask_obj,
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray"
+            b" /BitsPerComponent 8 /Filter /FlateDecode /Length %d >>" % (ow, oh, len(alpha)),
+            alpha,
+        )
+        yield pdf.obj(
+            name_obj,
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB"
+            b" /BitsPerComponent 8 /Filter /FlateDecode /SMask %d 0 R /Length %d >>" % (ow, oh, mask_obj, len(color)),
+            color,
+        )
+
+        width, height = overlay.page_size
+        page_w, page_h = _fmt(width * scale), _fmt(height * scale)
+        content = b"q %s 0 0 %s 0 0 cm /T Do Q\nq %s 0 0 %s %s %s cm /N Do Q\n" % (
+            page_w, page_h,
+            _fmt(ow * scale), _fmt(oh * scale),
+            _fmt(overlay.left * scale), _fmt((height - overlay.top - oh) * scale),
+        )
+        if overlay.qr is not None:
+            # Light background with the quiet zone, then the dark module runs
+            for gray, rects in ((b"1", [overlay.qr.background]), (b"0", overlay.qr.modules)):
+                content += b"%s g\n" % gray + b"".join(
+                    b"%s %s %s %s re\n" % (_fmt(x * scale), _fmt((height - y - h) * scale), _fmt(w * scale), _fmt(h * scale))
+                    for x, y, w, h in rects
+                ) + b"f\n"
+        yield pdf.obj(content_obj, b"<< /Length %d >>" % len(content), content)
+        yield pdf.obj(
+            page_obj,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Resources << /XObject << /T %d 0 R /N %d 0 R >> >>"
+            b" /Contents %d 0 R >>" % (pages, page_w, page_h, template_obj, name_obj, content_obj),
+        )
+        kids.append(page_obj)
+
+    if errors:
+        font_obj = pdf.reserve()
+        yield pdf.obj(font_obj, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        page_w, page_h = _ERROR_PAGE_SIZE
+        lines = [f"{len(errors)} certificate(s) could not be rendered:", ""] + errors
+        for start in range(0, len(lines), _ERROR_LINES_PER_PAGE):
+            content = b"BT /F 10 Tf 12 TL 40 %d Td\n" % (page_h - 48) + b"".join(
+                b"%s '\n" % _pdf_text(line) for line in lines[start:start + _ERROR_LINES_PER_PAGE]
+            ) + b"ET\n"
+            content_obj, page_obj = pdf.reserve(), pdf.reserve()
+            yield pdf.obj(content_obj, b"<< /Length %d >>" % len(content), content)
+            yield pdf.obj(
+                page_obj,
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F %d 0 R >> >>"
+                b" /Contents %d 0 R >>" % (pages, page_w, page_h, font_obj, content_obj),
+            )
+            kids.append(page_obj)
+
+    # Page tree, written in pieces so a 50k-page Kids array isn't one big string
+    pdf.offsets[pages - 1] = pdf.offset
+    yield pdf.emit(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (pages, len(kids)))
+    for start in range(0, len(kids), 4096):
+        yield pdf.emit(b"".join(b"%d 0 R " % k for k in kids[start:start + 4096]))
+    yield pdf.emit(b"] >>\nendobj\n")
+    yield pdf.obj(catalog, b"<< /Type /Catalog /Pages %d 0 R >>" % pages)
+
+    xref_offset = pdf.offset
+    count = len(pdf.offsets) + 1
+    yield b"xref\n0 %d\n0000000000 65535 f \n" % count
+    for start in range(0, len(pdf.offsets), 4096):
+        yield b"".join(b"%010d 00000 n \n" % off for off in pdf.offsets[start:start + 4096])
+    yield b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, catalog, xref_offset)
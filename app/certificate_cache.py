@@ -0,0 +1,395 @@
+"""
+Certificate Cache Module
+Sharded on-disk store for rendered PDFs, with an access index and a size budget
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process render lock (single-worker dev servers only)
+    fcntl = None  # type: ignore[assignment]
+
+# Certificate IDs hash onto this many lock files in <root>/.locks
+_LOCK_STRIPES = 256
+
+INDEX_FILENAME = ".cache-index.sqlite3"
+
+# Evict down to this fraction of the budget, so a full cache doesn't evict on every render
+_LOW_WATER = 0.9
+
+# Buffered access-time updates are written at least this often (seconds) or every N downloads
+_TOUCH_FLUSH_INTERVAL = 5.0
+_TOUCH_FLUSH_SIZE = 256
+
+
+class CertificateCache:
+    """PDFs and sidecars stored as `<root>/<shard>/<id>.pdf`, evicted least-recently-downloaded first."""
+
+    _instances: Dict[str, "CertificateCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, root: str, max_bytes: int = 0, max_files: int = 0):
+        """
+        Initialize the cache
+
+        Args:
+            root: Cache directory
+            max_bytes: Budget for PDFs plus sidecars (0 = unlimited)
+            max_files: Budget for cached certificates (0 = unlimited)
+        """
+        self.root = root
+        self.max_bytes = max(0, max_bytes)
+        self.max_files = max(0, max_files)
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        os.makedirs(root, exist_ok=True)
+
+        # Guards the SQLite connection; may be held for a whole eviction
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        # Guards only the in-memory touch buffer, so touch() never waits on SQLite
+        self._touch_lock = threading.Lock()
+        self._pending_touches: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        self._flush_scheduled = False
+        # This process only
+        self.downloads = 0
+        self.renders = 0
+
+    @classmethod
+    def for_directory(cls, root: str) -> "CertificateCache":
+        """
+        Shared cache for a directory, budgets from CERT_CACHE_MAX_MB / CERT_CACHE_MAX_FILES
+
+        Args:
+            root: Cache directory
+
+        Returns:
+            The process-wide cache instance for root
+        """
+        key = os.path.abspath(root)
+        with cls._instances_lock:
+            cache = cls._instances.get(key)
+            if cache is None:
+                max_mb = float(os.getenv("CERT_CACHE_MAX_MB", "0") or 0)
+                max_files = int(os.getenv("CERT_CACHE_MAX_FILES", "0") or 0)
+                cache = cls(key, max_bytes=int(max_mb * 1024 * 1024), max_files=max_files)
+                cls._instances[key] = cache
+            return cache
+
+    @classmethod
+    def flush_all(cls) -> None:
+        """Write buffered access times of every cache (call on shutdown)."""
+        with cls._instances_lock:
+            caches = list(cls._instances.values())
+        for cache in caches:
+            cache.flush()
+
+    # Paths
+
+    @staticmethod
+    def shard_of(certificate_id: str) -> str:
+        return hashlib.sha1(certificate_id.encode("utf-8")).hexdigest()[:2]
+
+    def shard_dir(self, certificate_id: str) -> str:
+        return os.path.join(self.root, self.shard_of(certificate_id))
+
+    def pdf_path(self, certificate_id: str) -> str:
+        return os.path.join(self.shard_dir(certificate_id), f"{certificate_id}.pdf")
+
+    def meta_path(self, certificate_id: str) -> str:
+        return os.path.join(self.shard_dir(certificate_id), f"{certificate_id}.meta.json")
+
+    def exists(self, certificate_id: str) -> bool:
+        return os.path.exists(self.pdf_path(certificate_id))
+
+    # Locking
+
+    @contextmanager
+    def lock(self, certificate_id: str, blocking: bool = True) -> Iterator[bool]:
+        """
+        Hold the cross-process lock for a certificate's files
+
+        Args:
+            certificate_id: Certificate to lock
+            blocking: Wait for the lock; otherwise yield False if it is taken
+
+        Yields:
+            Whether the lock was acquired
+        """
+        stripe = zlib.crc32(certificate_id.encode("utf-8")) % _LOCK_STRIPES
+        with self._flock(f"{stripe:03d}", blocking) as acquired:
+            yield acquired
+
+    @contextmanager
+    def named_lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        """
+        Hold a cross-process lock unrelated to any certificate
+
+        Args:
+            name: Lock name (a file name stem)
+            blocking: Wait for the lock; otherwise yield False if it is taken
+
+        Yields:
+            Whether the lock was acquired
+        """
+        with self._flock(f"named-{name}", blocking) as acquired:
+            yield acquired
+
+    @contextmanager
+    def _flock(self, stem: str, blocking: bool) -> Iterator[bool]:
+        if fcntl is None:
+            yield True
+            return
+
+        lock_dir = os.path.join(self.root, ".locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f"{stem}.lock"), "a+b") as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    # Index
+
+    def _connection(self) -> sqlite3.Connection:
+        # Callers hold self._lock. Reconnect after fork (gunicorn --preload).
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            initialized = conn.execute("SELECT value FROM counters WHERE name = 'initialized'").fetchone()
+            if initialized is None:
+                self._import_existing(conn)
+                conn.execute("INSERT INTO counters VALUES ('initialized', 1), ('evictions', 0)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def open(self) -> None:
+        """Open the index now, importing PDFs already on disk on first use (call at startup)."""
+        with self._lock:
+            self._connection()
+
+    def _import_existing(self, conn: sqlite3.Connection) -> None:
+        """Index PDFs already on disk, moving ones from the old flat layout into shards."""
+        rows: List[Tuple[str, int, float]] = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.endswith(".pdf") and not entry.name.startswith("."):
+                certificate_id = entry.name[: -len(".pdf")]
+                os.makedirs(self.shard_dir(certificate_id), exist_ok=True)
+                legacy_meta = os.path.join(self.root, f"{certificate_id}.meta.json")
+                # Sidecar first: a PDF without one is treated as stale and re-rendered.
+                if os.path.exists(legacy_meta):
+                    os.replace(legacy_meta, self.meta_path(certificate_id))
+                os.replace(entry.path, self.pdf_path(certificate_id))
+
+        for shard in os.scandir(self.root):
+            if not (shard.is_dir() and len(shard.name) == 2):
+                continue
+            for sub in os.scandir(shard.path):
+                if not sub.name.endswith(".pdf") or sub.name.startswith("."):
+                    continue
+                certificate_id = sub.name[: -len(".pdf")]
+                st = sub.stat()
+                rows.append((certificate_id, st.st_size + self._meta_size(certificate_id), st.st_mtime))
+        conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", rows)
+
+    def _meta_size(self, certificate_id: str) -> int:
+        try:
+            return os.stat(self.meta_path(certificate_id)).st_size
+        except OSError:
+            return 0
+
+    def record_write(self, certificate_id: str, size: int) -> int:
+        """
+        Index a freshly written certificate and enforce the budget
+
+        Args:
+            certificate_id: Certificate just written
+            size: Bytes on disk for the PDF and its sidecar
+
+        Returns:
+            Number of certificates evicted
+        """
+        with self._touch_lock:
+            self._pending_touches.pop(certificate_id, None)
+        with self._lock:
+            conn = self._connection()
+            self.renders += 1
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (certificate_id, size, time.time()))
+            if not (self.max_bytes or self.max_files):
+                return 0
+            self._flush_locked(conn)
+            return self._evict_locked(conn, keep=certificate_id)
+
+    def touch(self, certificate_id: str) -> None:
+        """
+        Record a download (buffered; written every few seconds)
+
+        Never touches SQLite itself, so it is safe on the event loop: a due
+        flush runs on a background thread.
+        """
+        with self._touch_lock:
+            self.downloads += 1
+            self._pending_touches[certificate_id] = time.time()
+            due = not self._flush_scheduled and (
+                len(self._pending_touches) >= _TOUCH_FLUSH_SIZE
+                or time.monotonic() - self._last_flush >= _TOUCH_FLUSH_INTERVAL
+            )
+            if due:
+                self._flush_scheduled = True
+        if due:
+            threading.Thread(target=self._background_flush, name="cache-flush", daemon=True).start()
+
+    def _background_flush(self) -> None:
+        try:
+            self.flush()
+        finally:
+            with self._touch_lock:
+                self._flush_scheduled = False
+
+    def flush(self) -> None:
+        with self._touch_lock:
+            if not self._pending_touches:
+                return
+        with self._lock:
+            self._flush_locked(self._connection())
+
+    def _flush_locked(self, conn: sqlite3.Connection) -> None:
+        with self._touch_lock:
+            touches, self._pending_touches = self._pending_touches, {}
+            self._last_flush = time.monotonic()
+        if touches:
+            conn.executemany(
+                "UPDATE entries SET last_access = MAX(last_access, ?) WHERE id = ?",
+                [(ts, certificate_id) for certificate_id, ts in touches.items()],
+            )
+
+    def discard(self, certificate_id: str) -> bool:
+        """
+        Delete a certificate's PDF and sidecar and drop it from the index
+
+        Args:
+            certificate_id: Certificate to delete
+
+        Returns:
+            True if a PDF was deleted
+        """
+        with self.lock(certificate_id):
+            deleted = False
+            for path in (self.meta_path(certificate_id), self.pdf_path(certificate_id)):
+                try:
+                    os.unlink(path)
+                    deleted = True
+                except FileNotFoundError:
+                    pass
+        with self._touch_lock:
+            self._pending_touches.pop(certificate_id, None)
+        with self._lock:
+            self._connection().execute("DELETE FROM entries WHERE id = ?", (certificate_id,))
+        return deleted
+
+    def evict(self) -> int:
+        """
+        Evict least recently downloaded certificates until within budget
+
+        Returns:
+            Number of certificates evicted
+        """
+        with self._lock:
+            conn = self._connection()
+            self._flush_locked(conn)
+            return self._evict_locked(conn, keep=None)
+
+    def _evict_locked(self, conn: sqlite3.Connection, keep: Optional[str]) -> int:
+        total_bytes, total_files = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+        over_bytes = self.max_bytes and total_bytes > self.max_bytes
+        over_files = self.max_files and total_files > self.max_files
+        if not (over_bytes or over_files):
+            return 0
+
+        target_bytes = int(self.max_bytes * _LOW_WATER) if self.max_bytes else None
+        target_files = int(self.max_files * _LOW_WATER) if self.max_files else None
+
+        def within_target() -> bool:
+            return (target_bytes is None or total_bytes <= target_bytes) and (
+                target_files is None or total_files <= target_files
+            )
+
+        evicted = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            candidates = conn.execute("SELECT id, size FROM entries ORDER BY last_access LIMIT 10000").fetchall()
+            for certificate_id, size in candidates:
+                if within_target():
+                    break
+                if certificate_id == keep:
+                    continue
+                # Skip certificates being rendered right now.
+                with self.lock(certificate_id, blocking=False) as acquired:
+                    if not acquired:
+                        continue
+                    for path in (self.meta_path(certificate_id), self.pdf_path(certificate_id)):
+                        try:
+                            os.unlink(path)
+                        except FileNotFoundError:
+                            pass
+                    conn.execute("DELETE FROM entries WHERE id = ?", (certificate_id,))
+                total_bytes -= size
+                total_files -= 1
+                evicted += 1
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (evicted,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Occupancy, budget and eviction counters; downloads/renders are per process."""
+        with self._lock:
+            conn = self._connection()
+            total_bytes, total_files = conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+            ).fetchone()
+            evictions = conn.execute("SELECT value FROM counters WHERE name = 'evictions'").fetchone()
+            downloads, renders = self.downloads, self.renders
+        return {
+            "files": total_files,
+            "bytes": total_bytes,
+            "max_files": self.max_files,
+            "max_bytes": self.max_bytes,
+            "evictions": evictions[0] if evictions else 0,
+            "downloads": downloads,
+            "renders": renders,
+        }
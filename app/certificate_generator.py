@@ -6,21 +6,440 @@ Key features:
 - Dynamic centering (no hardcoded X)
 - Dynamic font resizing to keep long names within margins
 - Uses draw.textbbox() for accurate text measurement
+- Decodes the template once and reuses it until the file changes
+- Resolves the font path once and caches loaded fonts by (path, size)
+- Optional vector engine: embeds the template image stream (JPEG bytes as-is)
+  and draws the name as real PDF text (CERT_PDF_ENGINE=vector)
+- Atomic writes (temp file + rename) and a per-certificate file lock so only
+  one process renders a given certificate at a time
+- Content-addressed cache: each PDF has a sidecar recording a fingerprint of
+  everything that affects its output, so stale PDFs are re-rendered
+- PDFs live in a sharded CertificateCache that can evict least recently
+  downloaded certificates to stay within a disk budget
+- A RenderPlan compiles the CERT_NAME_* layout once per template/config and
+  memoizes per-name layouts
 """
 
 from __future__ import annotations
 
+import copy
+import hashlib
+import io
+import json
+import math
 import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from PIL import Image, ImageDraw, ImageFont
 
+from app.certificate_cache import CertificateCache
+from app.metrics import metrics
+
+
+# Bounded LRU of FreeType faces shared by every generator in the process.
+_FONT_CACHE_SIZE = int(os.getenv("CERT_FONT_CACHE_SIZE", "128"))
+
+
+@lru_cache(maxsize=_FONT_CACHE_SIZE)
+def _truetype(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, size=size)
+
+
+def font_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the process-wide font cache (for monitoring)."""
+    info = _truetype.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
+# Output engines: "pillow" rasterizes the composited image, "vector" embeds
+# the template as-is and draws the name as PDF text (requires reportlab).
+PDF_ENGINES = ("pillow", "vector")
+PDF_RESOLUTION = 300.0
+
+# Bump when a code change alters rendered output, to invalidate cached PDFs.
+RENDER_VERSION = "1"
+
+# Settings (besides CERT_NAME_* and CERT_QR_*) that change the rendered PDF
+_LAYOUT_SETTINGS = ("CERT_PDF_TEMPLATE_QUALITY",)
+# Of the CERT_QR_* variables, only these place the code; the others choose its content
+_QR_LAYOUT_SETTINGS = ("CERT_QR_SIZE_RATIO", "CERT_QR_X_RATIO", "CERT_QR_Y_RATIO")
+
+# Light border around the QR code, in modules (the minimum scanners expect)
+_QR_QUIET_ZONE = 4
+
+
+def _is_layout_setting(key: str) -> bool:
+    return key.startswith("CERT_NAME_") or key in _LAYOUT_SETTINGS or key in _QR_LAYOUT_SETTINGS
+
+
+def _file_signature(path: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+# font path -> ((mtime_ns, size), sha256)
+_font_digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def _font_digest(font_path: str) -> str:
+    """sha256 of a font file, recomputed only when its mtime/size changes."""
+    try:
+        st = os.stat(font_path)
+    except OSError:
+        # Bare font names resolved by FreeType itself; the name is all we have.
+        return ""
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _font_digests.get(font_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(font_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _font_digests[font_path] = (signature, digest)
+    return digest
+
+
+# Font file path -> name registered with reportlab
+_pdf_fonts: Dict[str, str] = {}
+_pdf_fonts_lock = threading.Lock()
+
+
+def _register_pdf_font(font_path: str) -> str:
+    if not font_path or not os.path.isfile(font_path):
+        raise RuntimeError(
+            "The vector PDF engine needs a TrueType font file; set CERT_FONT_PATH to a .ttf path."
+        )
+    with _pdf_fonts_lock:
+        name = _pdf_fonts.get(font_path)
+        if name is None:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            name = f"CertName{len(_pdf_fonts)}"
+            pdfmetrics.registerFont(TTFont(name, font_path))
+            _pdf_fonts[font_path] = name
+        return name
+
+
+class _DecodedTemplate:
+    """A template file's bytes plus its pixels, decoded on first use."""
+
+    __slots__ = ("signature", "sha256", "data", "size", "_image", "pdf_image", "_lock")
+
+    def __init__(
+        self,
+        signature: Tuple[int, int],
+        sha256: str,
+        data: bytes,
+        size: Tuple[int, int],
+        image: Optional[Image.Image] = None,
+    ):
+        # (mtime_ns, size) of the template file
+        self.signature = signature
+        self.sha256 = sha256
+        # Encoded file bytes (source of the vector engine's image stream)
+        self.data = data
+        # (width, height) in pixels, known without decoding
+        self.size = size
+        # Pristine RGBA image; never drawn on, renders work on a copy.
+        self._image = image
+        # (JPEG quality, unregistered reportlab image XObject), built on first vector render
+        self.pdf_image: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def image(self) -> Image.Image:
+        image = self._image
+        if image is None:
+            with self._lock:
+                image = self._image
+                if image is None:
+                    with Image.open(io.BytesIO(self.data)) as img_in:
+                        image = img_in.convert("RGBA")
+                    self._image = image
+        return image
+
+    @property
+    def decoded(self) -> bool:
+        return self._image is not None or self.pdf_image is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the decoded forms (the file bytes excluded)."""
+        total = 0
+        if self._image is not None:
+            width, height = self.size
+            total += width * height * 4
+        if self.pdf_image is not None:
+            total += len(getattr(self.pdf_image[1], "streamContent", b"") or b"")
+        return total
+
+    def release(self) -> None:
+        """Drop the decoded forms; they are rebuilt from `data` on next use.
+
+        Renders already holding the image keep their reference.
+        """
+        with self._lock:
+            self._image = None
+            self.pdf_image = None
+
+
+class _NameLayout(NamedTuple):
+    """Where and how the student name is drawn, in template pixels."""
+
+    text: str
+    font: ImageFont.FreeTypeFont
+    x: float
+    y: float
+    color: Tuple[int, int, int, int]
+
+
+class _QRLayout(NamedTuple):
+    """A QR code as filled rectangles, in template pixels (x, y, width, height; y down)."""
+
+    # Light background including the quiet zone
+    background: Tuple[int, int, int, int]
+    # Dark modules, merged into horizontal runs
+    modules: List[Tuple[int, int, int, int]]
+
+
+class RenderPlan:
+    """Layout configuration resolved once per (template, settings, font).
+
+    Everything except the per-name layout memo is immutable; a new plan is
+    built when any input changes.
+    """
+
+    def __init__(
+        self,
+        *,
+        source: Tuple[Any, ...],
+        template_sha256: str,
+        size: Tuple[int, int],
+        settings: Dict[str, str],
+        engine: str,
+        font_path: Optional[str],
+        font_digest: str,
+        memo_size: int = 10000,
+    ):
+        width, height = size
+        self.source = source
+        self.width = width
+        self.height = height
+        self.settings = dict(settings)
+        self.engine = engine
+        self.font_path = font_path
+
+        # Layout controls
+        margin_px = settings.get("CERT_NAME_MARGIN_PX")
+        if margin_px and margin_px.strip().isdigit():
+            self.margin = int(margin_px)
+        else:
+            margin_ratio = float(settings.get("CERT_NAME_MARGIN_RATIO", "0.12"))
+            self.margin = int(width * margin_ratio)
+        self.max_text_width = max(1, width - 2 * self.margin)
+
+        # Font sizing: start relative to image width, with env overrides
+        self.start_size = int(settings.get("CERT_NAME_FONT_SIZE", str(max(24, int(width * 0.06)))))
+        self.min_size = int(settings.get("CERT_NAME_MIN_FONT_SIZE", "14"))
+
+        # Positioning (centered horizontally, adjustable vertically)
+        # Default places name below the "presented to" line on the template.
+        # Tune via CERT_NAME_Y_RATIO (0..1) or CERT_NAME_Y_OFFSET (pixels).
+        y_ratio = float(settings.get("CERT_NAME_Y_RATIO", "0.52"))
+        y_offset = float(settings.get("CERT_NAME_Y_OFFSET", "0"))
+        self.center_y = (height * y_ratio) + y_offset
+
+        # Styling
+        color_hex = (settings.get("CERT_NAME_COLOR", "#000000") or "#000000").strip()
+        if color_hex.startswith("#") and len(color_hex) in (7, 9):
+            r = int(color_hex[1:3], 16)
+            g = int(color_hex[3:5], 16)
+            b = int(color_hex[5:7], 16)
+            a = int(color_hex[7:9], 16) if len(color_hex) == 9 else 255
+            self.color = (r, g, b, a)
+        else:
+            self.color = (0, 0, 0, 255)
+
+        self.template_quality = int(settings.get("CERT_PDF_TEMPLATE_QUALITY", "75"))
+
+        # Verification QR code (drawn when a certificate has QR data): size
+        # relative to the template height, centre relative to width/height.
+        self.qr_size = int(height * float(settings.get("CERT_QR_SIZE_RATIO", "0.16")))
+        self.qr_center = (
+            width * float(settings.get("CERT_QR_X_RATIO", "0.88")),
+            height * float(settings.get("CERT_QR_Y_RATIO", "0.84")),
+        )
+
+        payload = json.dumps(
+            {
+                "version": RENDER_VERSION,
+                "engine": engine,
+                "template": template_sha256,
+                "font": [font_path or "", font_digest],
+                "settings": sorted(self.settings.items()),
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        self.fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+        # name -> _NameLayout (bounded LRU)
+        self._memo: "OrderedDict[str, _NameLayout]" = OrderedDict()
+        self._memo_size = memo_size
+        self._memo_lock = threading.Lock()
+
+    def name_fingerprint(self, student_name: str, qr_data: str = "") -> str:
+        """Fingerprint of this plan plus the name and QR content: equal digests give identical PDFs."""
+        name = (student_name or "").strip()
+        key = f"{self.fingerprint}\n{name}"
+        if qr_data:
+            key += f"\nqr\n{qr_data}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def qr_layout(self, qr_data: str) -> Optional[_QRLayout]:
+        """
+        Encode QR data and place it on the template
+
+        Modules are a whole number of pixels, so the code may come out
+        slightly smaller than CERT_QR_SIZE_RATIO asks for.
+
+        Args:
+            qr_data: Text to encode
+
+        Returns:
+            The code's rectangles, or None if there is nothing to encode
+        """
+        if not qr_data:
+            return None
+        from reportlab.graphics.barcode import qrencoder
+
+        with metrics.phase("render", "qr"):
+            qr = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.M)
+            qr.addData(qr_data)
+            qr.make()
+            count = qr.getModuleCount()
+
+            module = max(1, self.qr_size // (count + 2 * _QR_QUIET_ZONE))
+            side = module * (count + 2 * _QR_QUIET_ZONE)
+            left = int(round(self.qr_center[0] - side / 2))
+            top = int(round(self.qr_center[1] - side / 2))
+            origin_x = left + module * _QR_QUIET_ZONE
+            origin_y = top + module * _QR_QUIET_ZONE
+
+            modules = []
+            for row in range(count):
+                col = 0
+                while col < count:
+                    if not qr.isDark(row, col):
+                        col += 1
+                        continue
+                    start = col
+                    while col < count and qr.isDark(row, col):
+                        col += 1
+                    modules.append((origin_x + start * module, origin_y + row * module, (col - start) * module, module))
+        return _QRLayout((left, top, side, side), modules)
+
+    def layout(self, generator: "CertificateGenerator", draw: ImageDraw.ImageDraw, student_name: str) -> _NameLayout:
+        """Fit, truncate and position the student name, memoized per name."""
+        name = (student_name or "").strip()
+        if not name:
+            raise ValueError("Student name is empty")
+
+        with self._memo_lock:
+            cached = self._memo.get(name)
+            if cached is not None:
+                self._memo.move_to_end(name)
+                return cached
+
+        # Attach generator context for helpers
+        setattr(draw, "_certificate_generator", generator)
+
+        max_text_width = self.max_text_width
+        with metrics.phase("render", "fit"):
+            font, bbox = generator._fit_font(
+                draw, name, max_width=max_text_width, start_size=self.start_size, min_size=self.min_size
+            )
+        with metrics.phase("render", "truncate"):
+            text = generator._truncate_to_fit(draw, name, font, max_text_width, bbox=bbox)
+        if text != name:
+            bbox = draw.textbbox((0, 0), text, font=font)
+
+        left, top, right, bottom = bbox
+        text_w = right - left
+        text_h = bottom - top
+
+        # Compute centered position (no hardcoded x)
+        x = (self.width - text_w) / 2 - left
+        y = (self.center_y - (text_h / 2)) - top
+
+        # Safety clamp within margins
+        x = max(self.margin, min(x, (self.width - self.margin - text_w)))
+
+        layout = _NameLayout(text, font, x, y, self.color)
+        with self._memo_lock:
+            self._memo[name] = layout
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        return layout
+
+    def describe(self) -> Dict[str, Any]:
+        """Resolved settings, for the admin endpoint."""
+        return {
+            "fingerprint": self.fingerprint,
+            "engine": self.engine,
+            "template_size": [self.width, self.height],
+            "font_path": self.font_path,
+            "margin": self.margin,
+            "max_text_width": self.max_text_width,
+            "font_size": [self.min_size, self.start_size],
+            "center_y": self.center_y,
+            "color": list(self.color),
+            "qr_size": self.qr_size,
+            "qr_center": list(self.qr_center),
+            "settings": self.settings,
+            "memoized_names": len(self._memo),
+        }
+
+
+class NameOverlay(NamedTuple):
+    """The student name drawn on a tight transparent crop of the template."""
+
+    # (width, height) of the template, in pixels
+    page_size: Tuple[int, int]
+    image: Image.Image
+    # Top-left corner of `image` on the template, in pixels
+    left: int
+    top: int
+    # Verification QR code, if the certificate has one
+    qr: Optional[_QRLayout] = None
+
 
 class CertificateGenerator:
     """Generate personalized certificates from an image template and export as PDF."""
 
-    def __init__(self, template_path: str = "templates/certificate_template.jpg", output_dir: Optional[str] = "certificates"):
+    def __init__(
+        self,
+        template_path: str = "templates/certificate_template.jpg",
+        output_dir: Optional[str] = "certificates",
+        pdf_engine: Optional[str] = None,
+        layout_overrides: Optional[Dict[str, str]] = None,
+        event_code: str = "",
+    ):
         project_root = Path(__file__).resolve().parents[1]
 
         template_candidate = Path((template_path or "").replace("\\", "/"))
@@ -29,6 +448,12 @@ class CertificateGenerator:
         self.template_path = str(template_candidate)
 
         self._project_root = project_root
+        # None -> CERT_PDF_ENGINE (default "pillow")
+        self.pdf_engine = pdf_engine
+        # CERT_NAME_* settings for this generator, applied over the environment
+        self.layout_overrides = {k: str(v) for k, v in (layout_overrides or {}).items()}
+        # Registry event code ("" for the default template); selects the runtime overrides file
+        self.event_code = event_code
         if output_dir is None:
             self.output_dir = None
         else:
@@ -37,10 +462,126 @@ class CertificateGenerator:
                 output_candidate = project_root / output_candidate
             self.output_dir = str(output_candidate)
             os.makedirs(self.output_dir, exist_ok=True)
+        # Sharded PDF store with an access index and size budget
+        self.cache = CertificateCache.for_directory(self.output_dir) if self.output_dir else None
+
+        self._template: Optional[_DecodedTemplate] = None
+        self._template_lock = threading.Lock()
+
+        # (CERT_FONT_PATH value, resolved path) from the last font probe
+        self._font_path: Optional[Tuple[str, Optional[str]]] = None
+
+        self._plan: Optional[RenderPlan] = None
+        self._plan_lock = threading.Lock()
+
+    def _load_template(self) -> _DecodedTemplate:
+        """Return the template, re-reading it only if the file changed.
+
+        A changed mtime/size triggers a re-read; decoded pixels are kept if
+        the content hash is unchanged (e.g. the file was merely touched).
+        Pixels are decoded on first use of `.image`.
+        """
+        try:
+            st = os.stat(self.template_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Template image not found: {self.template_path}")
+        signature = (st.st_mtime_ns, st.st_size)
+
+        cached = self._template
+        if cached is not None and cached.signature == signature:
+            return cached
+
+        with self._template_lock:
+            cached = self._template
+            if cached is not None and cached.signature == signature:
+                return cached
+
+            with open(self.template_path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+
+            if cached is not None and cached.sha256 == digest:
+                size, image = cached.size, cached._image
+            else:
+                with Image.open(io.BytesIO(data)) as img_in:
+                    # Header only; pixels are decoded lazily.
+                    size, image = img_in.size, None
+
+            cached = _DecodedTemplate(signature, digest, data, size, image)
+            self._template = cached
+            return cached
+
+    def preload_template(self) -> None:
+        """Decode the template now.
+
+        Call before forking workers (gunicorn --preload) so the decoded pixels
+        are shared copy-on-write instead of being decoded in every worker.
+        """
+        self._load_template().image
+
+    def warm_fonts(self, sample_name: str = "Sample Student") -> None:
+        """Resolve the font and load the faces a typical name is fitted with.
+
+        With the vector engine this also registers the PDF font and encodes
+        the template's PDF image, so the first render pays for neither.
+        """
+        plan = self.render_plan()
+        plan.layout(self, ImageDraw.Draw(Image.new("RGBA", (1, 1))), sample_name)
+        if plan.engine == "vector":
+            _register_pdf_font(plan.font_path or "")
+            self._template_pdf_image(self._load_template(), plan.template_quality)
+
+    def template_memory(self, expected: bool = False) -> int:
+        """
+        Bytes held by the decoded template
+
+        Args:
+            expected: Count the pixels a render would decode even if they
+                aren't decoded yet (only known once the file has been read)
+
+        Returns:
+            Approximate size in bytes (0 if nothing is decoded)
+        """
+        template = self._template
+        if template is None:
+            return 0
+        if expected and template._image is None:
+            width, height = template.size
+            return template.nbytes + width * height * 4
+        return template.nbytes
+
+    def release_template(self) -> bool:
+        """
+        Drop the decoded template pixels to free memory
+
+        The file bytes and hash stay cached, so freshness checks stay cheap;
+        the next render decodes again.
+
+        Returns:
+            True if decoded data was released
+        """
+        template = self._template
+        if template is None or not template.decoded:
+            return False
+        template.release()
+        return True
 
     def _resolve_font_path(self) -> Optional[str]:
-        """Resolve a TTF/OTF font path (recommended) to enable resizing."""
+        """Resolve a TTF/OTF font path, probing the filesystem only once.
+
+        The result is re-resolved only when CERT_FONT_PATH changes.
+        """
         env_font = (os.getenv("CERT_FONT_PATH") or "").strip()
+        cached = self._font_path
+        if cached is not None and cached[0] == env_font:
+            return cached[1]
+
+        resolved = self._probe_font_path(env_font)
+        self._font_path = (env_font, resolved)
+        return resolved
+
+    def _probe_font_path(self, env_font: str) -> Optional[str]:
+        """Resolve a TTF/OTF font path (recommended) to enable resizing."""
         if env_font:
             p = Path(env_font.replace("\\", "/"))
             if not p.is_absolute():
@@ -96,7 +637,7 @@ class CertificateGenerator:
                 "No TrueType/OpenType font found for dynamic resizing. "
                 "Add a .ttf file and set CERT_FONT_PATH (e.g., templates/DejaVuSans-Bold.ttf)."
             )
-        return ImageFont.truetype(font_path, size=size)
+        return _truetype(font_path, size)
 
     @staticmethod
     def _fit_text(draw: ImageDraw.ImageDraw, text: str, *, max_width: int, start_size: int, min_size: int) -> ImageFont.FreeTypeFont:
@@ -104,26 +645,88 @@ class CertificateGenerator:
 
         If even min_size doesn't fit, this will still return min_size; caller can truncate.
         """
-        size = start_size
+        font, _ = CertificateGenerator._fit_font(draw, text, max_width=max_width, start_size=start_size, min_size=min_size)
+        return font
+
+    @staticmethod
+    def _fit_font(
+        draw: ImageDraw.ImageDraw, text: str, *, max_width: int, start_size: int, min_size: int
+    ) -> Tuple[ImageFont.FreeTypeFont, Tuple[int, int, int, int]]:
+        """Like _fit_text, but also return the text bbox measured at the chosen size.
+
+        Picks the largest size in start_size, start_size - 2, ... (>= min_size)
+        whose width fits. Instead of trying every step, the width measured at
+        start_size predicts the fitting step (text width scales ~linearly with
+        size); one or two measurements confirm it, with binary search as the
+        fallback when the prediction is off by more than one step.
+        """
         generator = getattr(draw, "_certificate_generator", None)
         if generator is None:
             raise RuntimeError("Internal error: generator context missing")
 
-        while size >= min_size:
-            font = generator._load_font(size)
-            left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
-            width = right - left
-            if width <= max_width:
-                return font
-            size -= 2
+        measured: Dict[int, Tuple[ImageFont.FreeTypeFont, Tuple[int, int, int, int]]] = {}
+
+        def measure(size: int) -> Tuple[ImageFont.FreeTypeFont, Tuple[int, int, int, int]]:
+            if size not in measured:
+                font = generator._load_font(size)
+                measured[size] = (font, draw.textbbox((0, 0), text, font=font))
+            return measured[size]
+
+        def fits(step: int) -> bool:
+            left, _, right, _ = measure(start_size - 2 * step)[1]
+            return (right - left) <= max_width
+
+        last_step = (start_size - min_size) // 2
+        if last_step < 0:
+            return measure(min_size)
+        if fits(0):
+            return measure(start_size)
+        if last_step == 0:
+            return measure(min_size)
+
+        left, _, right, _ = measured[start_size][1]
+        predicted = start_size * max_width / max(1, right - left)
+        step = min(last_step, max(1, math.ceil((start_size - predicted) / 2)))
+
+        if fits(step):
+            # Find the smallest fitting step in [1, step].
+            if step == 1 or not fits(step - 1):
+                return measure(start_size - 2 * step)
+            lo, hi = 1, step - 1
+        else:
+            # Find the smallest fitting step in [step + 1, last_step].
+            if step == last_step:
+                return measure(min_size)
+            if fits(step + 1):
+                return measure(start_size - 2 * (step + 1))
+            if step + 1 == last_step:
+                return measure(min_size)
+            lo, hi = step + 2, last_step
+            if not fits(hi):
+                return measure(min_size)
 
-        return generator._load_font(min_size)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if fits(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return measure(start_size - 2 * lo)
 
     @staticmethod
-    def _truncate_to_fit(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, max_width: int) -> str:
-        """Truncate with ellipsis if needed to ensure no overflow."""
+    def _truncate_to_fit(
+        draw: ImageDraw.ImageDraw,
+        text: str,
+        font: ImageFont.FreeTypeFont,
+        max_width: int,
+        bbox: Optional[Tuple[int, int, int, int]] = None,
+    ) -> str:
+        """Truncate with ellipsis if needed to ensure no overflow.
+
+        Pass `bbox` when the full text was already measured with `font`.
+        """
         ellipsis = "…"
-        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        left, top, right, bottom = bbox if bbox is not None else draw.textbbox((0, 0), text, font=font)
         if (right - left) <= max_width:
             return text
 
@@ -144,87 +747,477 @@ class CertificateGenerator:
                 hi = mid - 1
         return best or ellipsis
 
-    def generate_certificate(self, student_name: str, certificate_id: str) -> str:
-        if not self.output_dir:
-            raise RuntimeError("Output directory is not configured")
+    def _pdf_engine(self) -> str:
+        engine = (self.pdf_engine or os.getenv("CERT_PDF_ENGINE") or "pillow").strip().lower()
+        if engine not in PDF_ENGINES:
+            raise ValueError(f"Unknown CERT_PDF_ENGINE {engine!r}; expected one of: {', '.join(PDF_ENGINES)}")
+        return engine
 
-        if not os.path.exists(self.template_path):
-            raise FileNotFoundError(f"Template image not found: {self.template_path}")
+    def _layout_overrides_path(self) -> Optional[str]:
+        # One file per event code (".layout.WORKSHOP1.json"), so an admin
+        # change to one event's layout leaves the other events alone.
+        configured = (os.getenv("CERT_LAYOUT_FILE") or "").strip()
+        if configured:
+            p = Path(configured.replace("\\", "/"))
+            if not p.is_absolute():
+                p = self._project_root / p
+        elif self.output_dir:
+            p = Path(self.output_dir) / ".layout.json"
+        else:
+            return None
+        if self.event_code:
+            safe_code = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in self.event_code)
+            p = p.with_name(f"{p.stem}.{safe_code}{p.suffix}")
+        return str(p)
 
-        output_filename = f"{certificate_id}.pdf"
-        output_path = os.path.join(self.output_dir, output_filename)
+    def _read_layout_overrides(self, path: Optional[str]) -> Dict[str, str]:
+        if not path:
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return {str(k): str(v) for k, v in data.items() if _is_layout_setting(str(k))}
 
-        with Image.open(self.template_path) as img_in:
-            img = img_in.convert("RGBA")
-            draw = ImageDraw.Draw(img)
+    def _plan_source(self, template: _DecodedTemplate) -> Tuple[Any, ...]:
+        """Cheap key (a few stats) identifying the inputs of the current plan."""
+        overrides_path = self._layout_overrides_path()
+        font_path = self._resolve_font_path()
+        return (
+            template.sha256,
+            overrides_path,
+            _file_signature(overrides_path),
+            font_path,
+            _file_signature(font_path),
+            self._pdf_engine(),
+        )
 
-            # Attach generator context for helpers
-            setattr(draw, "_certificate_generator", self)
+    def _build_plan(self, template: _DecodedTemplate, source: Tuple[Any, ...], overrides: Dict[str, str]) -> RenderPlan:
+        settings = {k: v for k, v in os.environ.items() if _is_layout_setting(k)}
+        settings.update(self.layout_overrides)
+        settings.update(overrides)
+        font_path = self._resolve_font_path()
+        return RenderPlan(
+            source=source,
+            template_sha256=template.sha256,
+            size=template.size,
+            settings=settings,
+            engine=self._pdf_engine(),
+            font_path=font_path,
+            font_digest=_font_digest(font_path) if font_path else "",
+            memo_size=int(os.getenv("CERT_LAYOUT_MEMO_SIZE", "10000")),
+        )
 
-            width, height = img.size
+    def _render_plan(self, template: _DecodedTemplate) -> RenderPlan:
+        source = self._plan_source(template)
+        plan = self._plan
+        if plan is not None and plan.source == source:
+            return plan
 
-            # Layout controls
-            margin_px = os.getenv("CERT_NAME_MARGIN_PX")
-            if margin_px and margin_px.strip().isdigit():
-                margin = int(margin_px)
-            else:
-                margin_ratio = float(os.getenv("CERT_NAME_MARGIN_RATIO", "0.12"))
-                margin = int(width * margin_ratio)
-            max_text_width = max(1, width - 2 * margin)
-
-            # Font sizing: start relative to image width, with env overrides
-            start_size = int(os.getenv("CERT_NAME_FONT_SIZE", str(max(24, int(width * 0.06)))))
-            min_size = int(os.getenv("CERT_NAME_MIN_FONT_SIZE", "14"))
-
-            # Positioning (centered horizontally, adjustable vertically)
-            # Default places name below the "presented to" line on the template.
-            # Tune via CERT_NAME_Y_RATIO (0..1) or CERT_NAME_Y_OFFSET (pixels).
-            y_ratio = float(os.getenv("CERT_NAME_Y_RATIO", "0.52"))
-            y_offset = float(os.getenv("CERT_NAME_Y_OFFSET", "0"))
-            center_y = (height * y_ratio) + y_offset
-
-            # Styling
-            color_hex = (os.getenv("CERT_NAME_COLOR", "#000000") or "#000000").strip()
-            if color_hex.startswith("#") and len(color_hex) in (7, 9):
-                r = int(color_hex[1:3], 16)
-                g = int(color_hex[3:5], 16)
-                b = int(color_hex[5:7], 16)
-                a = int(color_hex[7:9], 16) if len(color_hex) == 9 else 255
-                name_color = (r, g, b, a)
-            else:
-                name_color = (0, 0, 0, 255)
+        with self._plan_lock:
+            plan = self._plan
+            if plan is not None and plan.source == source:
+                return plan
+            if plan is not None:
+                # Inputs changed: re-probe the font path as well.
+                self._font_path = None
+                source = self._plan_source(template)
+            plan = self._build_plan(template, source, self._read_layout_overrides(source[1]))
+            self._plan = plan
+            return plan
 
-            name = (student_name or "").strip()
-            if not name:
-                raise ValueError("Student name is empty")
+    def render_plan(self) -> RenderPlan:
+        """
+        Return the compiled layout plan for the current template and settings
 
-            font = self._fit_text(draw, name, max_width=max_text_width, start_size=start_size, min_size=min_size)
-            name = self._truncate_to_fit(draw, name, font, max_text_width)
+        Rebuilt automatically when the template, font file, PDF engine or the
+        layout overrides file changes.
+        """
+        return self._render_plan(self._load_template())
 
-            left, top, right, bottom = draw.textbbox((0, 0), name, font=font)
-            text_w = right - left
-            text_h = bottom - top
+    def rebuild_render_plan(self) -> RenderPlan:
+        """Drop the cached plan and font probe and build a fresh plan."""
+        with self._plan_lock:
+            self._plan = None
+            self._font_path = None
+        return self.render_plan()
 
-            # Compute centered position (no hardcoded x)
-            x = (width - text_w) / 2 - left
-            y = (center_y - (text_h / 2)) - top
+    def update_layout_overrides(self, overrides: Optional[Dict[str, Any]] = None) -> RenderPlan:
+        """
+        Replace the runtime layout overrides and rebuild the plan
 
-            # Safety clamp within margins
-            x = max(margin, min(x, (width - margin - text_w)))
+        The overrides file is shared by all workers on the host; each one
+        notices the change on its next render and rebuilds its own plan.
 
-            draw.text((x, y), name, font=font, fill=name_color)
+        Args:
+            overrides: CERT_NAME_* settings to apply on top of the environment,
+                or None to keep the current overrides and just force a rebuild
 
-            # Convert to RGB before saving as PDF (Pillow PDF export)
-            if img.mode != "RGB":
+        Returns:
+            The new plan
+
+        Raises:
+            ValueError: If a key is not a layout setting or a value is invalid
+        """
+        path = self._layout_overrides_path()
+        if not path:
+            raise RuntimeError("Output directory is not configured")
+
+        if overrides is None:
+            cleaned = self._read_layout_overrides(path)
+        else:
+            unknown = [k for k in overrides if not _is_layout_setting(str(k))]
+            if unknown:
+                raise ValueError(f"Not layout settings: {', '.join(sorted(unknown))}")
+            cleaned = {str(k): str(v) for k, v in overrides.items()}
+
+        # Validate by building a plan before publishing the file.
+        template = self._load_template()
+        self._build_plan(template, (), cleaned)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".layout.", suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cleaned, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return self.rebuild_render_plan()
+
+    def _save_raster_pdf(
+        self, plan: RenderPlan, template: _DecodedTemplate, student_name: str, output_path: str, qr_data: str = ""
+    ) -> None:
+        """Composite the name (and QR code) onto a copy of the template and encode it with Pillow."""
+        with metrics.phase("render", "decode"):
+            img = template.image.copy()
+        draw = ImageDraw.Draw(img)
+
+        layout = plan.layout(self, draw, student_name)
+        with metrics.phase("render", "draw"):
+            draw.text((layout.x, layout.y), layout.text, font=layout.font, fill=layout.color)
+
+        qr = plan.qr_layout(qr_data)
+        if qr is not None:
+            with metrics.phase("render", "draw"):
+                x, y, w, h = qr.background
+                draw.rectangle((x, y, x + w - 1, y + h - 1), fill=(255, 255, 255, 255))
+                for x, y, w, h in qr.modules:
+                    draw.rectangle((x, y, x + w - 1, y + h - 1), fill=(0, 0, 0, 255))
+
+        # Convert to RGB before saving as PDF (Pillow PDF export)
+        if img.mode != "RGB":
+            with metrics.phase("render", "composite"):
                 background = Image.new("RGB", img.size, (255, 255, 255))
                 background.paste(img, mask=img.split()[-1])
-                out_img = background
-            else:
-                out_img = img
+            out_img = background
+        else:
+            out_img = img
+
+        with metrics.phase("render", "save"):
+            out_img.save(output_path, "PDF", resolution=PDF_RESOLUTION)
+
+    @staticmethod
+    def _template_pdf_image(template: _DecodedTemplate, quality: int) -> Any:
+        """Return the template as a reportlab image XObject, encoding it at most once.
+
+        JPEG bytes are passed through unchanged (DCTDecode). Other formats are
+        JPEG-encoded once per template version at CERT_PDF_TEMPLATE_QUALITY.
+        Each call returns a fresh shallow copy sharing the encoded stream,
+        because reportlab marks an object as owned by the document it joins.
+        """
+        cached = template.pdf_image
+        if cached is not None and cached[0] == quality:
+            return copy.copy(cached[1])
+
+        from reportlab.pdfbase.pdfdoc import PDFImageXObject
+        from reportlab.pdfbase.pdfutils import readJPEGInfo
+
+        def load_jpeg(xobj: Any, data: bytes) -> bool:
+            # Like PDFImageXObject.loadImageFromJPEG, but always stores the
+            # stream raw: that one ASCII85-wraps it (+25% size) unless the
+            # process-wide rl_config.useA85 is turned off.
+            try:
+                width, height, components = readJPEGInfo(io.BytesIO(data))[:3]
+            except Exception:
+                return False
+            xobj.width, xobj.height, xobj.bitsPerComponent = width, height, 8
+            xobj.colorSpace = {1: "DeviceGray", 3: "DeviceRGB"}.get(components, "DeviceCMYK")
+            if xobj.colorSpace == "DeviceCMYK":
+                xobj._dotrans = 1
+            xobj.streamContent = data
+            xobj._filters = ("DCTDecode",)
+            xobj.mask = None
+            return True
+
+        xobj = PDFImageXObject(f"CertTemplate{template.sha256[:16]}")
+        if not (template.data[:2] == b"\xff\xd8" and load_jpeg(xobj, template.data)):
+            encoded = io.BytesIO()
+            template.image.convert("RGB").save(encoded, "JPEG", quality=quality)
+            load_jpeg(xobj, encoded.getvalue())
+
+        template.pdf_image = (quality, xobj)
+        return copy.copy(xobj)
+
+    def _save_vector_pdf(
+        self, plan: RenderPlan, template: _DecodedTemplate, student_name: str, output_path: str, qr_data: str = ""
+    ) -> None:
+        """Embed the pre-encoded template image and draw the name as vector text (and the QR code as rectangles).
+
+        The layout is computed with the same Pillow metrics as the raster path.
+        """
+        from reportlab.pdfgen import canvas
+
+        width, height = template.size
+        draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        layout = plan.layout(self, draw, student_name)
+
+        font_name = _register_pdf_font(plan.font_path or "")
+        with metrics.phase("render", "decode"):
+            xobj = self._template_pdf_image(template, plan.template_quality)
+        scale = 72.0 / PDF_RESOLUTION
+        page_w, page_h = width * scale, height * scale
+        ascent, _ = layout.font.getmetrics()
+        r, g, b, a = layout.color
+
+        pdf = canvas.Canvas(output_path, pagesize=(page_w, page_h), pageCompression=1)
+        # Register the shared XObject the way Canvas.drawImage does, minus the
+        # per-call decode/hash/encode of the image data.
+        pdf._doc.Reference(xobj, pdf._doc.getXObjectName(xobj.name))
+        pdf._doc.addForm(xobj.name, xobj)
+        pdf.saveState()
+        pdf.scale(page_w, page_h)
+        pdf.doForm(xobj.name)
+        pdf.restoreState()
+
+        pdf.setFillColorRGB(r / 255.0, g / 255.0, b / 255.0, alpha=a / 255.0)
+        pdf.setFont(font_name, layout.font.size * scale)
+        # Pillow positions text by its ascender line; PDF text by the baseline.
+        pdf.drawString(layout.x * scale, (height - (layout.y + ascent)) * scale, layout.text)
+
+        qr = plan.qr_layout(qr_data)
+        if qr is not None:
+            pdf.setFillAlpha(1)
+            for rects, gray in (([qr.background], 1), (qr.modules, 0)):
+                pdf.setFillGray(gray)
+                for x, y, w, h in rects:
+                    pdf.rect(x * scale, (height - y - h) * scale, w * scale, h * scale, stroke=0, fill=1)
+        pdf.showPage()
+        with metrics.phase("render", "save"):
+            pdf.save()
 
-            out_img.save(output_path, "PDF", resolution=300.0)
+    def name_overlay(self, student_name: str, qr_data: str = "") -> Tuple[Any, NameOverlay]:
+        """
+        Split a certificate into the shared template image and a name overlay
+
+        Used to compose many certificates into one PDF while embedding each
+        template only once. Stacking the overlay on the template gives the
+        same pixels as the Pillow engine.
+
+        Args:
+            student_name: Name to print on the certificate
+            qr_data: Content of the verification QR code ("" for none)
+
+        Returns:
+            (template reportlab image XObject, name overlay)
+
+        Raises:
+            ValueError: If the name is empty
+        """
+        template = self._load_template()
+        plan = self._render_plan(template)
+        draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        layout = plan.layout(self, draw, student_name)
 
+        left, top, right, bottom = draw.textbbox((layout.x, layout.y), layout.text, font=layout.font)
+        left, top = math.floor(left), math.floor(top)
+        right, bottom = math.ceil(right), math.ceil(bottom)
+        image = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(image).text(
+            (layout.x - left, layout.y - top), layout.text, font=layout.font, fill=layout.color
+        )
+        xobj = self._template_pdf_image(template, plan.template_quality)
+        return xobj, NameOverlay(template.size, image, left, top, plan.qr_layout(qr_data))
+
+    def render_fingerprint(self, student_name: str, qr_data: str = "") -> str:
+        """
+        Fingerprint of everything that determines a certificate's PDF
+
+        Covers the template content, font path and content, CERT_NAME_* and
+        other output settings, the PDF engine, the name and the QR content.
+
+        Args:
+            student_name: Name to print on the certificate
+            qr_data: Content of the verification QR code ("" for none)
+
+        Returns:
+            Hex digest; equal digests produce identical certificates
+        """
+        return self.render_plan().name_fingerprint(student_name, qr_data)
+
+    def _meta_path(self, certificate_id: str) -> str:
+        if self.cache is None:
+            raise RuntimeError("Output directory is not configured")
+        return self.cache.meta_path(certificate_id)
+
+    def _read_meta(self, certificate_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._meta_path(certificate_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return meta if isinstance(meta, dict) else {}
+
+    def _write_meta(self, certificate_id: str, meta: Dict[str, Any]) -> None:
+        meta_path = self._meta_path(certificate_id)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{certificate_id}.", suffix=".tmp", dir=os.path.dirname(meta_path))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, meta_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def current_certificate_meta(
+        self, student_name: str, certificate_id: str, qr_data: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the sidecar of a cached PDF if it was rendered with the current inputs
+
+        PDFs without a sidecar (rendered before fingerprints existed) count as
+        stale, and so does a sidecar written for a different file than the PDF
+        now in place (the PDF was replaced and its sidecar not yet rewritten),
+        so the sidecar's sha256 always describes the bytes on disk.
+
+        Args:
+            student_name: Name the certificate should show
+            certificate_id: Certificate ID to check
+            qr_data: QR content the certificate should show
+
+        Returns:
+            Sidecar dict (fingerprint, sha256, size, inode, mtime_ns) or None if
+            missing/stale
+        """
+        if not self.output_dir:
+            return None
+        meta = self._read_meta(certificate_id)
+        if meta.get("fingerprint") != self.render_fingerprint(student_name, qr_data):
+            return None
+        try:
+            st = os.stat(self.get_certificate_path(certificate_id))
+        except OSError:
+            return None
+        if (meta.get("size"), meta.get("inode"), meta.get("mtime_ns")) != (st.st_size, st.st_ino, st.st_mtime_ns):
+            return None
+        return meta
+
+    def is_certificate_current(self, student_name: str, certificate_id: str, qr_data: str = "") -> bool:
+        """
+        Check that a cached PDF exists and was rendered with the current inputs
+
+        Args:
+            student_name: Name the certificate should show
+            certificate_id: Certificate ID to check
+            qr_data: QR content the certificate should show
+
+        Returns:
+            True if the cached PDF can be served as-is
+        """
+        return self.current_certificate_meta(student_name, certificate_id, qr_data) is not None
+
+    def generate_certificate(self, student_name: str, certificate_id: str, qr_data: str = "") -> str:
+        if self.cache is None:
+            raise RuntimeError("Output directory is not configured")
+
+        output_path = self.cache.pdf_path(certificate_id)
+        shard_dir = os.path.dirname(output_path)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        with metrics.phase("render", "open"):
+            template = self._load_template()
+            plan = self._render_plan(template)
+        fingerprint = plan.name_fingerprint(student_name, qr_data)
+
+        # Render to a temp file and rename it into place, so readers never
+        # see a partially written PDF.
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{certificate_id}.", suffix=".tmp", dir=shard_dir)
+        os.close(fd)
+        try:
+            if plan.engine == "vector":
+                self._save_vector_pdf(plan, template, student_name, tmp_path, qr_data)
+            else:
+                self._save_raster_pdf(plan, template, student_name, tmp_path, qr_data)
+            with metrics.phase("render", "write"):
+                with open(tmp_path, "rb") as f:
+                    data = f.read()
+                    # The rename keeps inode and mtime, so the sidecar can name this file.
+                    st = os.fstat(f.fileno())
+                os.replace(tmp_path, output_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with metrics.phase("render", "index"):
+            # Written after the PDF. Until then the old sidecar names the old
+            # file, so readers treat the PDF as stale rather than serving the
+            # new bytes under the old hash.
+            self._write_meta(
+                certificate_id,
+                {
+                    "fingerprint": fingerprint,
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                    "size": len(data),
+                    "inode": st.st_ino,
+                    "mtime_ns": st.st_mtime_ns,
+                },
+            )
+            # May evict least recently downloaded certificates to stay within budget.
+            self.cache.record_write(certificate_id, len(data) + os.stat(self._meta_path(certificate_id)).st_size)
+        metrics.inc("certificate_renders_total")
+        metrics.inc("certificate_bytes_written_total", len(data))
         return output_path
+
+    def ensure_certificate(self, student_name: str, certificate_id: str, force: bool = False, qr_data: str = "") -> str:
+        """
+        Render a certificate unless a current one exists, coordinating with other processes
+
+        Only one process renders a given certificate at a time; the others wait
+        for the lock and then reuse its output. A forced regeneration is skipped
+        if another process finished a render while this one was waiting.
+
+        Args:
+            student_name: Name to print on the certificate
+            certificate_id: Certificate ID (PDF filename stem)
+            force: Re-render even if the PDF is current
+            qr_data: Content of the verification QR code ("" for none)
+
+        Returns:
+            Path to the certificate PDF
+        """
+        output_path = self.get_certificate_path(certificate_id)
+        if not force and self.is_certificate_current(student_name, certificate_id, qr_data):
+            return output_path
+
+        requested_ns = time.time_ns()
+        with self.cache.lock(certificate_id):
+            if self.is_certificate_current(student_name, certificate_id, qr_data):
+                if not force or os.stat(output_path).st_mtime_ns >= requested_ns:
+                    return output_path
+            return self.generate_certificate(student_name, certificate_id, qr_data)
     
     def certificate_exists(self, certificate_id: str) -> bool:
         """
@@ -236,11 +1229,10 @@ class CertificateGenerator:
         Returns:
             True if certificate exists, False otherwise
         """
-        if not self.output_dir:
+        if self.cache is None:
             return False
 
-        output_path = os.path.join(self.output_dir, f"{certificate_id}.pdf")
-        return os.path.exists(output_path)
+        return self.cache.exists(certificate_id)
     
     def get_certificate_path(self, certificate_id: str) -> str:
         """
@@ -252,7 +1244,12 @@ class CertificateGenerator:
         Returns:
             Path to the certificate PDF
         """
-        if not self.output_dir:
+        if self.cache is None:
             raise RuntimeError("Output directory is not configured")
 
-        return os.path.join(self.output_dir, f"{certificate_id}.pdf")
+        return self.cache.pdf_path(certificate_id)
+
+    def record_download(self, certificate_id: str) -> None:
+        """Mark a certificate as recently downloaded (it is evicted last)."""
+        if self.cache is not None:
+            self.cache.touch(certificate_id)
@@ -0,0 +1,166 @@
+"""
+Certificate Tokens Module
+HMAC-signed certificate tokens that can be verified without the roster
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+from app.csv_handler import CSVHandler
+from app.template_registry import normalize_code
+
+TOKEN_VERSION = 1
+
+# Bytes of the HMAC-SHA256 kept in a token (128 bits)
+_MAC_BYTES = 16
+# Bytes of the name's SHA-256 kept in a token
+_NAME_HASH_BYTES = 9
+# Shortest secret accepted, in bytes
+_MIN_SECRET_BYTES = 16
+# Domain separation, so the keys can't be used to forge other HMACs
+_MAC_CONTEXT = b"certificate-token\n"
+
+
+class TokenClaims(NamedTuple):
+    """What a valid token vouches for."""
+
+    student_id: str
+    code: str
+    # base64url SHA-256 prefix of the normalized name
+    name_hash: str
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def name_hash(name: str) -> str:
+    """Hash of a name as matched by the roster (case and whitespace insensitive)."""
+    # Same normalization as roster lookups, so the two can't drift apart.
+    normalized = CSVHandler._normalize_name(name)
+    return _b64encode(hashlib.sha256(normalized.encode("utf-8")).digest()[:_NAME_HASH_BYTES])
+
+
+class CertificateSigner:
+    """Issues and checks `<payload>.<mac>` tokens; checking is pure CPU work."""
+
+    def __init__(self, secrets: List[bytes], qr_enabled: bool = True, qr_url: str = ""):
+        """
+        Initialize the signer
+
+        Args:
+            secrets: HMAC keys; the first signs, all of them verify (key rotation)
+            qr_enabled: Print the token as a QR code on rendered certificates
+            qr_url: QR content with a `{token}` placeholder (e.g. a verification
+                URL); empty to encode the bare token
+
+        Raises:
+            ValueError: If there is no secret or one is too short
+        """
+        if not secrets:
+            raise ValueError("At least one token secret is required")
+        for secret in secrets:
+            if len(secret) < _MIN_SECRET_BYTES:
+                raise ValueError(f"Token secrets must be at least {_MIN_SECRET_BYTES} bytes")
+        self._keys = list(secrets)
+        self.qr_enabled = qr_enabled
+        self.qr_url = qr_url
+
+    def _mac(self, key: bytes, payload: bytes) -> bytes:
+        return hmac.new(key, _MAC_CONTEXT + payload, hashlib.sha256).digest()[:_MAC_BYTES]
+
+    def sign(self, student_id: str, code: str, name: str) -> str:
+        """
+        Issue the token for a student's certificate
+
+        Args:
+            student_id: Student ID from the roster
+            code: Event code from the roster
+            name: Name printed on the certificate
+
+        Returns:
+            URL-safe token
+        """
+        payload = json.dumps(
+            [TOKEN_VERSION, (student_id or "").strip(), normalize_code(code), name_hash(name)],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode("utf-8")
+        return f"{_b64encode(payload)}.{_b64encode(self._mac(self._keys[0], payload))}"
+
+    def verify(self, token: str) -> Optional[TokenClaims]:
+        """
+        Check a token's signature and decode it
+
+        Args:
+            token: Token as issued by sign()
+
+        Returns:
+            The claims, or None if the token is malformed or not signed by any key
+        """
+        encoded_payload, _, encoded_mac = (token or "").strip().partition(".")
+        try:
+            payload = _b64decode(encoded_payload)
+            mac = _b64decode(encoded_mac)
+        except (binascii.Error, ValueError):
+            return None
+        if len(mac) != _MAC_BYTES:
+            return None
+        if not any(hmac.compare_digest(mac, self._mac(key, payload)) for key in self._keys):
+            return None
+
+        try:
+            version, student_id, code, hashed_name = json.loads(payload)
+        except (ValueError, TypeError):
+            return None
+        if version != TOKEN_VERSION:
+            return None
+        return TokenClaims(student_id, code, hashed_name)
+
+    @staticmethod
+    def name_matches(claims: TokenClaims, name: str) -> bool:
+        """Whether a name is the one the token was issued for."""
+        return hmac.compare_digest(claims.name_hash, name_hash(name))
+
+    def token_for(self, student: Dict[str, str]) -> str:
+        """Token for a normalized roster row."""
+        return self.sign(student.get("Student_Id") or "", student.get("Code") or "", student.get("Name") or "")
+
+    def qr_data(self, student: Dict[str, str]) -> str:
+        """
+        What the certificate's QR code encodes for a roster row
+
+        Returns:
+            The token (inside CERT_QR_URL if set), or "" when QR codes are off
+        """
+        if not self.qr_enabled:
+            return ""
+        token = self.token_for(student)
+        return self.qr_url.replace("{token}", token) if self.qr_url else token
+
+
+def signer_from_env() -> Optional[CertificateSigner]:
+    """
+    Build the signer from CERT_TOKEN_SECRET / CERT_TOKEN_PREVIOUS_SECRETS / CERT_QR_*
+
+    Returns:
+        The signer, or None if CERT_TOKEN_SECRET is not set
+    """
+    secret = os.getenv("CERT_TOKEN_SECRET", "")
+    if not secret:
+        return None
+    previous = [s.strip() for s in os.getenv("CERT_TOKEN_PREVIOUS_SECRETS", "").split(",") if s.strip()]
+    return CertificateSigner(
+        [s.encode("utf-8") for s in [secret, *previous]],
+        qr_enabled=os.getenv("CERT_QR_ENABLED", "1").strip().lower() not in ("0", "false", "no"),
+        qr_url=os.getenv("CERT_QR_URL", "").strip(),
+    )
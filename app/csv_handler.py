@@ -4,13 +4,66 @@ Handles reading and searching student data from a CSV export
 """
 
 import csv
+import logging
 import os
+import threading
 from pathlib import Path
-from typing import Optional, List, Dict, Iterable
+from typing import Optional, List, Dict, Iterable, Iterator, Tuple
+
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RosterSnapshot:
+    """Immutable, indexed view of one version of the roster file.
+
+    A snapshot is built completely before it is published, so readers holding a
+    reference never observe a partially built index.
+    """
+
+    __slots__ = ("students", "by_key", "by_id", "signature")
+
+    def __init__(self, students: List[Dict[str, str]], signature: Tuple[str, int, int]):
+        by_key: Dict[Tuple[str, str], Dict[str, str]] = {}
+        by_id: Dict[str, Dict[str, str]] = {}
+        for student in students:
+            sid = CSVHandler._normalize_student_id(student.get("Student_Id", ""))
+            key = (CSVHandler._normalize_name(student.get("Name", "")), sid)
+            # First row wins, matching the original linear scan.
+            by_key.setdefault(key, student)
+            by_id.setdefault(sid, student)
+
+        self.students = students
+        self.by_key = by_key
+        self.by_id = by_id
+        # (path, mtime_ns, size) of the file this snapshot was parsed from
+        self.signature = signature
+
+    def find(self, name: str, student_id: str) -> Optional[Dict[str, str]]:
+        """O(1) lookup by normalized name and student ID."""
+        with metrics.phase("roster", "lookup"):
+            key = (CSVHandler._normalize_name(name), CSVHandler._normalize_student_id(student_id))
+            return self.by_key.get(key)
+
+    def find_by_id(self, student_id: str) -> Optional[Dict[str, str]]:
+        """O(1) lookup by normalized student ID."""
+        return self.by_id.get(CSVHandler._normalize_student_id(student_id))
+
+    def find_many(self, pairs: Iterable[Tuple[str, str]]) -> Iterator[Optional[Dict[str, str]]]:
+        """Look up many (name, student_id) pairs against this one snapshot, lazily."""
+        normalize_name = CSVHandler._normalize_name
+        normalize_id = CSVHandler._normalize_student_id
+        get = self.by_key.get
+        for name, student_id in pairs:
+            yield get((normalize_name(name), normalize_id(student_id)))
 
 
 class CSVHandler:
     """Handle CSV operations for student data"""
+
+    # Lookups on a current snapshot are dict hits, cheap enough for the event loop.
+    in_memory = True
     
     def __init__(self, csv_path: str = "students.csv"):
         """
@@ -28,6 +81,19 @@ class CSVHandler:
         self.csv_path = str(candidate)
         self._project_root = project_root
 
+        # Parsed roster, swapped in atomically whenever the file changes on disk.
+        self._snapshot: Optional[RosterSnapshot] = None
+        self._reload_lock = threading.Lock()
+
+    # Canonical field -> accepted header spellings, in priority order.
+    FIELD_ALIASES: Dict[str, Tuple[str, ...]] = {
+        "Name": ("Name", "Full Name", "Student Name"),
+        "Student_Id": ("Student_Id", "Student ID", "StudentId", "Student_Id "),
+        "Email_id": ("Email_id", "Email id", "Email", "Email ID", "Email Address"),
+        "Course": ("Course", "Program", "Branch"),
+        "Code": ("Code", "Workshop", "Event", "Batch"),
+    }
+
     @staticmethod
     def _normalize_key(key: str) -> str:
         return "".join(ch for ch in (key or "").strip().lower() if ch.isalnum() or ch == "_")
@@ -35,12 +101,51 @@ class CSVHandler:
     @classmethod
     def _get_first(cls, row: Dict[str, str], keys: Iterable[str]) -> str:
         normalized_row = {cls._normalize_key(k): v for k, v in row.items()}
+        return cls._first_present(normalized_row, keys)
+
+    @classmethod
+    def _first_present(cls, normalized_row: Dict[str, str], keys: Iterable[str]) -> str:
         for key in keys:
             value = normalized_row.get(cls._normalize_key(key))
             if value is not None:
                 return str(value)
         return ""
 
+    @classmethod
+    def compile_header(cls, header: List[str]) -> List[Tuple[str, Tuple[int, ...]]]:
+        """
+        Resolve each canonical field to candidate column indexes for a header row
+
+        Args:
+            header: The CSV header row
+
+        Returns:
+            List of (field, column indexes in alias priority order)
+        """
+        # Later duplicates win, as they did when rows were read into dicts.
+        positions = {cls._normalize_key(col): idx for idx, col in enumerate(header)}
+
+        plan: List[Tuple[str, Tuple[int, ...]]] = []
+        for field, aliases in cls.FIELD_ALIASES.items():
+            indexes: List[int] = []
+            for alias in aliases:
+                idx = positions.get(cls._normalize_key(alias))
+                if idx is not None and idx not in indexes:
+                    indexes.append(idx)
+            plan.append((field, tuple(indexes)))
+        return plan
+
+    @classmethod
+    def _report_header(cls, path: str, header: List[str], plan: List[Tuple[str, Tuple[int, ...]]]) -> None:
+        missing = [field for field, indexes in plan if not indexes]
+        if missing:
+            logger.warning("CSV %s has no column for: %s", path, ", ".join(missing))
+
+        used = {idx for _, indexes in plan for idx in indexes}
+        unknown = [col for idx, col in enumerate(header) if idx not in used]
+        if unknown:
+            logger.info("CSV %s: ignoring columns: %s", path, ", ".join(unknown))
+
     @staticmethod
     def _normalize_name(value: str) -> str:
         # Collapse internal whitespace and normalize case.
@@ -53,14 +158,107 @@ class CSVHandler:
 
     def normalize_student(self, row: Dict[str, str]) -> Dict[str, str]:
         """Return a canonical student dict regardless of CSV header variations."""
+        normalized_row = {self._normalize_key(k): v for k, v in row.items()}
         return {
-            "Name": self._get_first(row, ["Name", "Full Name", "Student Name"]),
-            "Student_Id": self._get_first(row, ["Student_Id", "Student ID", "StudentId", "Student_Id "]),
-            "Email_id": self._get_first(row, ["Email_id", "Email id", "Email", "Email ID", "Email Address"]),
-            "Course": self._get_first(row, ["Course", "Program", "Branch"]),
-            "Code": self._get_first(row, ["Code", "Workshop", "Event", "Batch"]),
+            field: self._first_present(normalized_row, aliases)
+            for field, aliases in self.FIELD_ALIASES.items()
         }
         
+    def _stat_csv(self) -> os.stat_result:
+        """Stat the roster file, falling back to legacy locations if it is missing."""
+        try:
+            return os.stat(self.csv_path)
+        except FileNotFoundError:
+            pass
+
+        # Backward-compatible fallbacks (older deployments used data/students.csv)
+        fallbacks = [
+            str(self._project_root / "students.csv"),
+            str(self._project_root / "data" / "students.csv"),
+        ]
+        for candidate in fallbacks:
+            try:
+                st = os.stat(candidate)
+            except FileNotFoundError:
+                continue
+            self.csv_path = candidate
+            return st
+
+        raise FileNotFoundError(f"CSV file not found: {self.csv_path}")
+
+    def _read_students(self, path: str) -> List[Dict[str, str]]:
+        students: List[Dict[str, str]] = []
+        # Use utf-8-sig to tolerate CSVs saved with a BOM (common with Excel/Forms exports)
+        with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return students
+
+            plan = self.compile_header(header)
+            self._report_header(path, header, plan)
+
+            for row in reader:
+                if not row:
+                    # csv.DictReader skips blank lines; keep that behaviour.
+                    continue
+                width = len(row)
+                student: Dict[str, str] = {}
+                for field, indexes in plan:
+                    value = ""
+                    for idx in indexes:
+                        if idx < width:
+                            value = row[idx]
+                            break
+                    student[field] = value
+                students.append(student)
+        return students
+
+    def snapshot(self) -> RosterSnapshot:
+        """
+        Return the current indexed roster, reloading only if the file changed
+
+        Costs a single stat() when the cached snapshot is still current.
+
+        Raises:
+            FileNotFoundError: If CSV file doesn't exist
+        """
+        st = self._stat_csv()
+        signature = (self.csv_path, st.st_mtime_ns, st.st_size)
+
+        snap = self._snapshot
+        if snap is not None and snap.signature == signature:
+            return snap
+
+        with self._reload_lock:
+            # Another thread may have reloaded while we waited for the lock.
+            snap = self._snapshot
+            if snap is not None and snap.signature == signature:
+                return snap
+
+            with metrics.phase("roster", "parse"):
+                snap = RosterSnapshot(self._read_students(signature[0]), signature)
+            self._snapshot = snap
+            return snap
+
+    def cached_snapshot(self) -> Optional[RosterSnapshot]:
+        """
+        Return the loaded snapshot if it is still current, without reloading
+
+        Returns:
+            The current snapshot, or None if the file changed or was never loaded
+
+        Raises:
+            FileNotFoundError: If CSV file doesn't exist
+        """
+        snap = self._snapshot
+        if snap is None:
+            return None
+        st = self._stat_csv()
+        if snap.signature != (self.csv_path, st.st_mtime_ns, st.st_size):
+            return None
+        return snap
+
     def get_all_students(self) -> List[Dict[str, str]]:
         """
         Read all students from CSV file
@@ -71,27 +269,8 @@ class CSVHandler:
         Raises:
             FileNotFoundError: If CSV file doesn't exist
         """
-        if not os.path.exists(self.csv_path):
-            # Backward-compatible fallbacks (older deployments used data/students.csv)
-            fallbacks = [
-                str(self._project_root / "students.csv"),
-                str(self._project_root / "data" / "students.csv"),
-            ]
-            for candidate in fallbacks:
-                if os.path.exists(candidate):
-                    self.csv_path = candidate
-                    break
-            else:
-                raise FileNotFoundError(f"CSV file not found: {self.csv_path}")
-        
-        students: List[Dict[str, str]] = []
-        # Use utf-8-sig to tolerate CSVs saved with a BOM (common with Excel/Forms exports)
-        with open(self.csv_path, 'r', encoding='utf-8-sig', newline='') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                students.append(self.normalize_student(row))
-        
-        return students
+        with metrics.phase("roster", "list"):
+            return list(self.snapshot().students)
     
     def find_student_by_name_and_id(self, name: str, student_id: str) -> Optional[Dict[str, str]]:
         """
@@ -104,21 +283,34 @@ class CSVHandler:
         Returns:
             Dictionary containing student data if found, None otherwise
         """
-        students = self.get_all_students()
-        
-        # Normalize inputs for comparison
-        name_normalized = self._normalize_name(name)
-        student_id_normalized = self._normalize_student_id(student_id)
-        
-        for student in students:
-            student_name = self._normalize_name(student.get('Name', ''))
-            student_sid = self._normalize_student_id(student.get('Student_Id', ''))
-            
-            # Match both name and student ID
-            if student_name == name_normalized and student_sid == student_id_normalized:
-                return student
-        
-        return None
+        return self.snapshot().find(name, student_id)
+
+    def find_student_by_id(self, student_id: str) -> Optional[Dict[str, str]]:
+        """
+        Find a student by student ID only
+
+        Args:
+            student_id: The student ID to search for
+
+        Returns:
+            Dictionary containing student data if found, None otherwise
+        """
+        return self.snapshot().find_by_id(student_id)
+
+    def find_students(self, pairs: Iterable[Tuple[str, str]]) -> List[Optional[Dict[str, str]]]:
+        """
+        Find many students by name and student ID in one pass
+
+        All pairs are resolved against the same roster snapshot, so a reload
+        mid-batch can't mix two versions of the file.
+
+        Args:
+            pairs: (name, student_id) tuples
+
+        Returns:
+            Student data (or None) for each pair, in order
+        """
+        return list(self.snapshot().find_many(pairs))
     
     def generate_certificate_id(self, student_id: str) -> str:
         """
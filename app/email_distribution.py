@@ -0,0 +1,558 @@
+"""
+Email Distribution Module
+Mails every student their certificate over a small pool of persistent SMTP connections
+"""
+
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import ssl
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.certificate_cache import CertificateCache
+from app.template_registry import TemplateRegistry
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_LOG_FILENAME = ".email-deliveries.sqlite3"
+
+# Held by the worker running a distribution, so two workers never mail the same roster
+_DISTRIBUTION_LOCK = "email-distribution"
+
+DEFAULT_SUBJECT = "Your certificate ({certificate_id})"
+DEFAULT_BODY = "Dear {name},\n\nPlease find your certificate attached.\n\nCertificate ID: {certificate_id}\n"
+
+
+class SMTPConfig(NamedTuple):
+    """SMTP server, sender and sending limits."""
+
+    host: str
+    port: int = 587
+    username: str = ""
+    password: str = ""
+    # "starttls", "ssl" (implicit TLS) or "none"
+    security: str = "starttls"
+    sender: str = ""
+    sender_name: str = ""
+    timeout: float = 30.0
+    # Open connections, which is also the number of messages sent at once
+    pool_size: int = 4
+    # Messages per connection before it is replaced (servers often cap a session)
+    messages_per_connection: int = 100
+    # Retries of a temporary failure (4xx reply, dropped connection)
+    max_retries: int = 3
+    retry_base_seconds: float = 2.0
+    subject: str = DEFAULT_SUBJECT
+    body: str = DEFAULT_BODY
+
+
+def smtp_config_from_env() -> Optional[SMTPConfig]:
+    """
+    Build the SMTP settings from SMTP_* / EMAIL_* environment variables
+
+    Returns:
+        The settings, or None if SMTP_HOST is not set
+    """
+    host = os.getenv("SMTP_HOST", "").strip()
+    if not host:
+        return None
+
+    security = os.getenv("SMTP_SECURITY", "starttls").strip().lower()
+    if security not in ("starttls", "ssl", "none"):
+        raise ValueError(f"SMTP_SECURITY must be starttls, ssl or none, got {security!r}")
+    username = os.getenv("SMTP_USERNAME", "")
+    return SMTPConfig(
+        host=host,
+        port=int(os.getenv("SMTP_PORT", "465" if security == "ssl" else "587")),
+        username=username,
+        password=os.getenv("SMTP_PASSWORD", ""),
+        security=security,
+        sender=os.getenv("EMAIL_FROM", username),
+        sender_name=os.getenv("EMAIL_FROM_NAME", ""),
+        timeout=float(os.getenv("SMTP_TIMEOUT", "30")),
+        pool_size=max(1, int(os.getenv("SMTP_POOL_SIZE", "4"))),
+        messages_per_connection=max(1, int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", "100"))),
+        max_retries=max(0, int(os.getenv("SMTP_MAX_RETRIES", "3"))),
+        retry_base_seconds=float(os.getenv("SMTP_RETRY_BASE_SECONDS", "2")),
+        subject=os.getenv("EMAIL_SUBJECT", DEFAULT_SUBJECT),
+        body=os.getenv("EMAIL_BODY", DEFAULT_BODY).replace("\\n", "\n"),
+    )
+
+
+class _PooledConnection:
+    __slots__ = ("smtp", "sent")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """Up to `pool_size` logged-in SMTP sessions, reused across messages and threads."""
+
+    def __init__(self, config: SMTPConfig):
+        """
+        Initialize the pool (connections are opened on first use)
+
+        Args:
+            config: SMTP settings
+        """
+        self.config = config
+        self.connections_opened = 0
+        self._idle: List[_PooledConnection] = []
+        self._slots = threading.BoundedSemaphore(config.pool_size)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> _PooledConnection:
+        config = self.config
+        if config.security == "ssl":
+            smtp: smtplib.SMTP = smtplib.SMTP_SSL(
+                config.host, config.port, timeout=config.timeout, context=ssl.create_default_context()
+            )
+        else:
+            smtp = smtplib.SMTP(config.host, config.port, timeout=config.timeout)
+        try:
+            if config.security == "starttls":
+                smtp.starttls(context=ssl.create_default_context())
+            if config.username:
+                smtp.login(config.username, config.password)
+        except BaseException:
+            _close_quietly(smtp)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return _PooledConnection(smtp)
+
+    def send(self, message: EmailMessage) -> None:
+        """
+        Send one message on a pooled connection, blocking while all are busy
+
+        A reused connection the server has dropped in the meantime is replaced
+        once. Refused messages keep the connection; network errors close it.
+
+        Args:
+            message: Complete message (From/To set)
+
+        Raises:
+            smtplib.SMTPException, OSError: If sending fails
+        """
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            try:
+                try:
+                    conn.smtp.send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    if not reused:
+                        raise
+                    _close_quietly(conn.smtp)
+                    conn = self._connect()
+                    conn.smtp.send_message(message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                # smtplib resets the session after a refused message, so the
+                # connection stays usable unless the server is closing it (421).
+                if getattr(e, "smtp_code", None) == 421:
+                    _close_quietly(conn.smtp)
+                else:
+                    with self._lock:
+                        self._idle.append(conn)
+                raise
+            except BaseException:
+                _close_quietly(conn.smtp)
+                raise
+
+            conn.sent += 1
+            if conn.sent >= self.config.messages_per_connection:
+                _close_quietly(conn.smtp)
+                return
+            with self._lock:
+                self._idle.append(conn)
+
+    def close(self) -> None:
+        """QUIT every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close_quietly(conn.smtp)
+
+
+def _close_quietly(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except Exception:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+
+def _is_temporary(error: Exception) -> bool:
+    """Whether a send failure is worth retrying: 4xx replies and network errors."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class DeliveryLog:
+    """Per-recipient delivery status in `<root>/.email-deliveries.sqlite3`, shared by all workers."""
+
+    def __init__(self, root: str):
+        """
+        Initialize the log
+
+        Args:
+            root: Directory holding the database (the certificates directory)
+        """
+        self.path = os.path.join(root, DELIVERY_LOG_FILENAME)
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Callers hold self._lock. Reconnect after fork (gunicorn --preload).
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            "certificate_id TEXT PRIMARY KEY, email TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, error TEXT, updated_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def load(self) -> Dict[str, Tuple[str, str]]:
+        """
+        Every recorded delivery
+
+        Returns:
+            certificate_id -> (email, status)
+        """
+        with self._lock:
+            rows = self._connection().execute("SELECT certificate_id, email, status FROM deliveries").fetchall()
+        return {certificate_id: (email, status) for certificate_id, email, status in rows}
+
+    def record(self, certificate_id: str, email: str, status: str, attempts: int, error: Optional[str] = None) -> None:
+        """
+        Store the outcome of a delivery
+
+        Args:
+            certificate_id: Certificate that was mailed
+            email: Recipient address
+            status: "sent" or "failed"
+            attempts: Send attempts made
+            error: Last error, for failures
+        """
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO deliveries VALUES (?, ?, ?, ?, ?, ?)",
+                (certificate_id, email, status, attempts, error, time.time()),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Recorded deliveries per status."""
+        with self._lock:
+            rows = self._connection().execute("SELECT status, COUNT(*) FROM deliveries GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class EmailTask(NamedTuple):
+    """One certificate to mail."""
+
+    name: str
+    certificate_id: str
+    email: str
+    # Event code, selects the template through the TemplateRegistry
+    code: str = ""
+    # Content of the verification QR code ("" for none)
+    qr_data: str = ""
+
+
+class DistributionJob:
+    """Progress of one background distribution run."""
+
+    def __init__(self, job_id: str, tasks: List[EmailTask], resend: bool):
+        self.job_id = job_id
+        self.tasks = tasks
+        self.resend = resend
+        self.status = "pending"
+        self.sent: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: List[Dict[str, str]] = []
+        # Dropped by a cancel before their message went out
+        self.cancelled: List[str] = []
+        self.retries = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        # Renders submitted but not finished, cancelled along with the job
+        self._renders: Set["Future[str]"] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "cancelled", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            sent, skipped, failed = len(self.sent), len(self.skipped), list(self.failed)
+            cancelled = len(self.cancelled)
+
+        total = len(self.tasks)
+        remaining = max(0, total - sent - skipped - len(failed) - cancelled)
+
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        throughput = (sent + len(failed)) / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if not self.finished and throughput > 0:
+            eta = round(remaining / throughput, 1)
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": total,
+            "sent": sent,
+            "skipped": skipped,
+            "failed": len(failed),
+            "cancelled": cancelled,
+            "remaining": remaining,
+            "retries": self.retries,
+            "throughput_per_sec": round(throughput, 2),
+            "eta_seconds": eta,
+            "elapsed_seconds": round(elapsed, 1),
+            "errors": failed,
+            "error": self.error,
+        }
+
+
+class DistributionManager:
+    """Run DistributionJobs: render or reuse each PDF, then mail it through the SMTP pool."""
+
+    def __init__(
+        self,
+        config: SMTPConfig,
+        registry: TemplateRegistry,
+        render: Callable[[EmailTask], "Future[str]"],
+        history: int = 20,
+    ):
+        """
+        Initialize the manager
+
+        Args:
+            config: SMTP settings
+            registry: Per-event templates (their caches hold the PDFs)
+            render: Starts rendering a missing certificate and returns a
+                future resolving to its PDF path (e.g. on the batch process pool)
+            history: Number of finished jobs kept for status queries
+        """
+        self.config = config
+        self.registry = registry
+        self.render = render
+        self.history = history
+        cache = registry.default.cache
+        if cache is None:
+            raise ValueError("Email distribution needs a certificates directory")
+        self.cache: CertificateCache = cache
+        self.log = DeliveryLog(cache.root)
+        self._jobs: "OrderedDict[str, DistributionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, tasks: List[EmailTask], resend: bool = False) -> DistributionJob:
+        """
+        Start a background distribution and return immediately
+
+        Args:
+            tasks: Certificates to mail
+            resend: Mail recipients the delivery log already marks as sent
+
+        Returns:
+            The new job (poll it with get())
+        """
+        job = DistributionJob(uuid.uuid4().hex, list(tasks), resend)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            finished = [jid for jid, j in self._jobs.items() if j.finished]
+            for jid in finished[: max(0, len(self._jobs) - self.history)]:
+                del self._jobs[jid]
+
+        thread = threading.Thread(target=self._run, args=(job,), name=f"email-{job.job_id[:8]}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[DistributionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[DistributionJob]:
+        """Stop a job; messages already being sent finish, queued renders are dropped."""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            self._cancel(job)
+        return job
+
+    @staticmethod
+    def _cancel(job: DistributionJob) -> None:
+        job.cancel_event.set()
+        with job._lock:
+            renders = list(job._renders)
+        for future in renders:
+            future.cancel()
+
+    def _run(self, job: DistributionJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            with self.cache.named_lock(_DISTRIBUTION_LOCK, blocking=False) as acquired:
+                if not acquired:
+                    raise RuntimeError("Another distribution is running")
+                pool = SMTPConnectionPool(self.config)
+                try:
+                    self._feed(job, pool)
+                finally:
+                    pool.close()
+            job.status = "cancelled" if job.cancel_event.is_set() else "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def _feed(self, job: DistributionJob, pool: SMTPConnectionPool) -> None:
+        delivered = {} if job.resend else self.log.load()
+        # Renders and sends in flight; bounded so the roster isn't queued at once
+        slots = threading.BoundedSemaphore(self.config.pool_size * 4)
+
+        with ThreadPoolExecutor(max_workers=self.config.pool_size, thread_name_prefix="smtp") as senders:
+
+            def send(task: EmailTask, pdf_path: str) -> None:
+                try:
+                    if job.cancel_event.is_set():
+                        self._cancelled(job, task)
+                    else:
+                        self._deliver(job, pool, task, pdf_path)
+                finally:
+                    slots.release()
+
+            def rendered(task: EmailTask, future: "Future[str]") -> None:
+                with job._lock:
+                    job._renders.discard(future)
+                if job.cancel_event.is_set():
+                    self._cancelled(job, task)
+                    slots.release()
+                    return
+                error = None if future.cancelled() else future.exception()
+                if future.cancelled() or error is not None:
+                    self._fail(job, task, f"render: {error or 'cancelled'}", attempts=0)
+                    slots.release()
+                    return
+                senders.submit(send, task, future.result())
+
+            for task in job.tasks:
+                if job.cancel_event.is_set():
+                    break
+                if delivered.get(task.certificate_id) == (task.email, "sent"):
+                    with job._lock:
+                        job.skipped.append(task.certificate_id)
+                    continue
+
+                slots.acquire()
+                generator = self.registry.generator_for(task.code)
+                if generator.is_certificate_current(task.name, task.certificate_id, task.qr_data):
+                    senders.submit(send, task, generator.cache.pdf_path(task.certificate_id))
+                    continue
+                try:
+                    future = self.render(task)
+                except Exception as e:
+                    self._fail(job, task, f"render: {e}", attempts=0)
+                    slots.release()
+                    continue
+                with job._lock:
+                    job._renders.add(future)
+                # A cancel that raced the submit didn't see this future
+                if job.cancel_event.is_set():
+                    future.cancel()
+                future.add_done_callback(lambda future, task=task: rendered(task, future))
+
+            # Wait for renders still running; their callbacks submit the last sends.
+            for _ in range(self.config.pool_size * 4):
+                slots.acquire()
+
+    def _deliver(self, job: DistributionJob, pool: SMTPConnectionPool, task: EmailTask, pdf_path: str) -> None:
+        try:
+            message = self._message(task, pdf_path)
+        except Exception as e:
+            self._fail(job, task, str(e), attempts=0)
+            return
+
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                pool.send(message)
+            except Exception as e:
+                if attempts > self.config.max_retries or not _is_temporary(e):
+                    self._fail(job, task, f"{type(e).__name__}: {e}", attempts)
+                    return
+                with job._lock:
+                    job.retries += 1
+                # Exponential backoff with jitter, cut short by a cancel
+                delay = self.config.retry_base_seconds * (2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+                if job.cancel_event.wait(delay):
+                    self._cancelled(job, task)
+                    return
+                continue
+
+            self.log.record(task.certificate_id, task.email, "sent", attempts)
+            with job._lock:
+                job.sent.append(task.certificate_id)
+            return
+
+    def _fail(self, job: DistributionJob, task: EmailTask, error: str, attempts: int) -> None:
+        logger.warning("Mailing %s to %s failed: %s", task.certificate_id, task.email, error)
+        self.log.record(task.certificate_id, task.email, "failed", attempts, error)
+        with job._lock:
+            job.failed.append({"certificate_id": task.certificate_id, "email": task.email, "error": error})
+
+    def _cancelled(self, job: DistributionJob, task: EmailTask) -> None:
+        # Not written to the delivery log, so a later run mails them.
+        with job._lock:
+            job.cancelled.append(task.certificate_id)
+
+    def _message(self, task: EmailTask, pdf_path: str) -> EmailMessage:
+        config = self.config
+        fields = {"name": task.name, "certificate_id": task.certificate_id, "code": task.code}
+        message = EmailMessage()
+        message["From"] = formataddr((config.sender_name, config.sender)) if config.sender_name else config.sender
+        message["To"] = task.email
+        message["Subject"] = config.subject.format(**fields)
+        message["Message-ID"] = make_msgid(domain=config.sender.rpartition("@")[2] or None)
+        message.set_content(config.body.format(**fields))
+        with open(pdf_path, "rb") as f:
+            message.add_attachment(
+                f.read(), maintype="application", subtype="pdf", filename=f"{task.certificate_id}.pdf"
+            )
+        return message
+
+    def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            self._cancel(job)
@@ -3,9 +3,18 @@ FastAPI Certificate Distribution System
 Main application with all API endpoints
 """
 
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import math
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, TypeVar
 
 try:
     from dotenv import load_dotenv
@@ -15,20 +24,54 @@ except Exception:
     # dotenv is optional on Render; env vars are injected there.
     pass
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Body, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.csv_handler import CSVHandler
-from app.certificate_generator import CertificateGenerator
+from app.admission import AdmissionRejected, RateLimiter, RenderAdmission
+from app.csv_handler import RosterSnapshot
+from app.batch_jobs import BatchJob, BatchJobManager, RenderTask
+from app.bulk_export import iter_certificate_files, stream_merged_pdf, stream_zip
+from app.certificate_cache import CertificateCache
+from app.certificate_generator import CertificateGenerator, font_cache_stats
+from app.certificate_tokens import signer_from_env
+from app.email_distribution import DistributionManager, EmailTask, smtp_config_from_env
+from app.http_files import file_response
+from app.metrics import ServerTimingMiddleware, metrics
+from app.render_manifest import ManifestDiff, RenderManifest
+from app.sqlite_roster import roster_handler_from_env
+from app.template_registry import normalize_code, registry_from_env
+from app.warmup import Warmup
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up before taking traffic; past WARMUP_TIMEOUT the worker starts
+    # anyway and /health/ready keeps answering 503 until warm-up finishes.
+    task = asyncio.ensure_future(_run_blocking(roster_executor, warmup.run))
+    try:
+        await asyncio.wait_for(asyncio.shield(task), WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up still running after %ss; serving requests cold", WARMUP_TIMEOUT)
+    yield
+    warmup.stop()
+    if email_distribution is not None:
+        email_distribution.shutdown()
+    batch_jobs.shutdown()
+    CertificateCache.flush_all()
+    render_executor.shutdown(wait=False, cancel_futures=True)
+    roster_executor.shutdown(wait=False, cancel_futures=True)
 
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Certificate Distribution System",
     description="A system for generating and distributing certificates",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ---- Environment / Paths (Render-friendly) ----
@@ -43,6 +86,9 @@ TEMPLATE_IMAGE = os.getenv("CERTIFICATE_TEMPLATE_IMAGE", "templates/certificate_
 # Admin key for protected endpoints (optional)
 ADMIN_KEY = os.getenv("ADMIN_KEY", "")
 
+# Browsers revalidate with If-None-Match and get a 304 while the PDF is unchanged.
+CERT_CACHE_CONTROL = os.getenv("CERT_CACHE_CONTROL", "private, no-cache")
+
 
 def _as_abs(path_str: str) -> str:
     # Allow Windows-style env var paths (e.g., "data\\students.csv") even on Linux.
@@ -64,13 +110,170 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request phase durations (roster lookup, render phases) as a Server-Timing header
+if os.getenv("SERVER_TIMING", "0").strip().lower() in ("1", "true", "yes"):
+    app.add_middleware(ServerTimingMiddleware)
+
 
 # Initialize handlers
-csv_handler = CSVHandler(_as_abs(CSV_PATH))
+# ROSTER_BACKEND=sqlite serves lookups from an indexed SQLite copy of the CSV
+csv_handler = roster_handler_from_env(_as_abs(CSV_PATH))
 cert_generator = CertificateGenerator(
     template_path=_as_abs(TEMPLATE_IMAGE),
     output_dir=_as_abs(CERTIFICATES_DIR),
 )
+# Per-event templates keyed by the roster's Code column (CERT_TEMPLATE_REGISTRY)
+template_registry = registry_from_env(cert_generator, PROJECT_ROOT)
+
+# Signed certificate tokens (CERT_TOKEN_SECRET), printed as a QR code and
+# checked by /verify/token without the roster
+certificate_signer = signer_from_env()
+
+
+def _qr_data(student: Dict[str, str]) -> str:
+    return certificate_signer.qr_data(student) if certificate_signer is not None else ""
+
+
+batch_jobs = BatchJobManager(cert_generator, registry=template_registry)
+
+# Mailing certificates to the roster's Email_id addresses (needs SMTP_HOST)
+_smtp_config = smtp_config_from_env()
+email_distribution: Optional[DistributionManager] = None
+if _smtp_config is not None:
+    email_distribution = DistributionManager(
+        _smtp_config,
+        template_registry,
+        render=lambda task: batch_jobs.submit_render(
+            RenderTask(task.name, task.certificate_id, task.code, task.qr_data)
+        ),
+    )
+
+# What the last /generate-all rendered, so re-runs only render roster changes
+render_manifest = RenderManifest(cert_generator.output_dir)
+
+# Blocking work (Pillow renders, roster re-parses) runs on bounded thread
+# pools so the event loop keeps serving /verify and cached downloads.
+RENDER_CONCURRENCY = int(os.getenv("RENDER_CONCURRENCY", str(os.cpu_count() or 1)))
+ROSTER_IO_THREADS = int(os.getenv("ROSTER_IO_THREADS", "2"))
+render_executor = ThreadPoolExecutor(max_workers=max(1, RENDER_CONCURRENCY), thread_name_prefix="render")
+roster_executor = ThreadPoolExecutor(max_workers=max(1, ROSTER_IO_THREADS), thread_name_prefix="roster")
+
+# Cold renders beyond RENDER_CONCURRENCY running + RENDER_QUEUE_MAX waiting get a fast 503.
+RENDER_QUEUE_MAX = int(os.getenv("RENDER_QUEUE_MAX", "64"))
+render_admission = RenderAdmission(concurrency=RENDER_CONCURRENCY, max_queue=RENDER_QUEUE_MAX)
+
+# Per-client requests per minute (0 = unlimited), per worker process
+verify_rate_limit = RateLimiter(int(os.getenv("RATE_LIMIT_VERIFY", "0")))
+certificate_rate_limit = RateLimiter(int(os.getenv("RATE_LIMIT_CERTIFICATE", "0")))
+# Reverse proxies in front of the app that append to X-Forwarded-For (0 = use the socket address)
+_trust_proxy = os.getenv("RATE_LIMIT_TRUST_PROXY", "0").strip().lower()
+RATE_LIMIT_TRUSTED_HOPS = 1 if _trust_proxy in ("true", "yes") else int(_trust_proxy) if _trust_proxy.isdigit() else 0
+
+# Startup warm-up (roster index, templates, fonts); WARMUP_PRERENDER=1 then
+# renders missing certificates in the background, pausing for cold requests.
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "30"))
+warmup = Warmup(
+    csv_handler,
+    template_registry,
+    prerender=os.getenv("WARMUP_PRERENDER", "0").strip().lower() in ("1", "true", "yes"),
+    busy=lambda: render_admission.pending > 0,
+    qr_data_for=_qr_data,
+)
+
+T = TypeVar("T")
+
+
+async def _run_blocking(executor: ThreadPoolExecutor, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Carry context variables into the worker thread.
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+# (certificate_id, force) -> render in progress in this process (single-flight)
+_inflight_renders: Dict[Tuple[str, bool], "asyncio.Future[str]"] = {}
+
+
+def _timed_render(generator: CertificateGenerator, name: str, certificate_id: str, force: bool, qr_data: str) -> str:
+    start = time.perf_counter()
+    try:
+        return generator.ensure_certificate(name, certificate_id, force, qr_data)
+    finally:
+        render_admission.observe(time.perf_counter() - start)
+
+
+def _render_finished(key: Tuple[str, bool], future: "asyncio.Future[str]") -> None:
+    render_admission.release()
+    if _inflight_renders.get(key) is future:
+        _inflight_renders.pop(key)
+
+
+async def _ensure_certificate(
+    generator: CertificateGenerator, name: str, certificate_id: str, force: bool, qr_data: str = ""
+) -> str:
+    # Concurrent requests for the same certificate share one render; the
+    # generator's file lock does the same across gunicorn workers. Only a
+    # new render takes a queue slot (raises AdmissionRejected when full).
+    # Forced renders are keyed apart, so force=True never settles for a
+    # normal render that may just reuse the cached PDF.
+    key = (certificate_id, force)
+    future = _inflight_renders.get(key)
+    if future is None:
+        render_admission.admit()
+        future = asyncio.ensure_future(
+            _run_blocking(render_executor, _timed_render, generator, name, certificate_id, force, qr_data)
+        )
+        _inflight_renders[key] = future
+        future.add_done_callback(functools.partial(_render_finished, key))
+    # shield: a disconnecting client must not cancel a render others await
+    return await asyncio.shield(future)
+
+
+def _client_key(request: Request) -> str:
+    # Each trusted proxy appends the address it received the request from, so
+    # the client is the entry RATE_LIMIT_TRUSTED_HOPS from the right; anything
+    # further left was sent by the client and can't be trusted.
+    if RATE_LIMIT_TRUSTED_HOPS:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if len(forwarded) >= RATE_LIMIT_TRUSTED_HOPS:
+            return forwarded[-RATE_LIMIT_TRUSTED_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def _check_rate_limit(limiter: RateLimiter, request: Request) -> None:
+    if not limiter.enabled:
+        return
+    wait = limiter.check(_client_key(request))
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests; slow down",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+async def _find_student(name: str, student_id: str) -> Optional[Dict[str, str]]:
+    # Current in-memory snapshot: O(1) lookup inline. Stale/unloaded or
+    # SQLite-backed (queries can wait on disk or the pool): off-loop.
+    if csv_handler.in_memory:
+        snap = csv_handler.cached_snapshot()
+        if snap is not None:
+            return snap.find(name, student_id)
+    return await _run_blocking(roster_executor, csv_handler.find_student_by_name_and_id, name, student_id)
+
+
+async def _roster_snapshot() -> RosterSnapshot:
+    if csv_handler.in_memory:
+        snap = csv_handler.cached_snapshot()
+        if snap is not None:
+            return snap
+    return await _run_blocking(roster_executor, csv_handler.snapshot)
+
+# Decode the templates at import time so `gunicorn --preload` shares the
+# decoded pixels copy-on-write across workers.
+if os.getenv("CERT_PRELOAD_TEMPLATE", "1").strip().lower() not in ("0", "false", "no"):
+    # A missing/broken template is reported when a certificate is requested.
+    template_registry.preload()
 
 
 # Serve templates directory as static (optional assets)
@@ -111,6 +314,7 @@ async def health_check() -> Dict[str, Any]:
 
     return {
         "status": "running",
+        "ready": warmup.ready,
         "paths": {
             "csv": csv_abs,
             "csv_exists": Path(csv_abs).exists(),
@@ -119,11 +323,50 @@ async def health_check() -> Dict[str, Any]:
             "certificates_dir": certificates_abs,
             "certificates_dir_exists": Path(certificates_abs).exists(),
         },
+        "font_cache": font_cache_stats(),
+        "templates": template_registry.stats(),
+        "certificate_cache": await _run_blocking(roster_executor, cert_generator.cache.stats),
+        "render_queue": render_admission.stats(),
+        "rate_limited": {"verify": verify_rate_limit.limited, "certificate": certificate_rate_limit.limited},
+        "warmup": warmup.status(),
     }
 
 
+@app.get("/health/ready")
+async def readiness_check() -> JSONResponse:
+    """
+    Readiness probe: 200 once the startup warm-up has finished, else 503
+
+    /health stays a liveness check that answers as soon as the worker is up.
+
+    Returns:
+        Warm-up status
+    """
+    status = warmup.status()
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """
+    Phase histograms and counters of this worker in Prometheus text format
+
+    Enabled with METRICS_ENABLED=1. Each gunicorn worker (and each batch
+    pool process) keeps its own numbers; a scrape sees one worker.
+
+    Returns:
+        Prometheus exposition text
+
+    Raises:
+        HTTPException: If metrics are disabled
+    """
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (set METRICS_ENABLED=1)")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/verify")
-async def verify_certificate(name: str, student_id: str) -> Dict[str, Any]:
+async def verify_certificate(request: Request, name: str, student_id: str) -> Dict[str, Any]:
     """
     Verify a certificate and return student information
     
@@ -135,10 +378,11 @@ async def verify_certificate(name: str, student_id: str) -> Dict[str, Any]:
         Student information and validity status
         
     Raises:
-        HTTPException: If student not found
+        HTTPException: If student not found (404) or the client is rate limited (429)
     """
+    _check_rate_limit(verify_rate_limit, request)
     try:
-        student = csv_handler.find_student_by_name_and_id(name, student_id)
+        student = await _find_student(name, student_id)
     except FileNotFoundError as e:
         raise HTTPException(
             status_code=503,
@@ -158,7 +402,7 @@ async def verify_certificate(name: str, student_id: str) -> Dict[str, Any]:
     
     certificate_id = csv_handler.generate_certificate_id(student.get("Student_Id"))
     
-    return {
+    result = {
         "name": student.get("Name"),
         "email": student.get("Email_id"),
         "student_id": student.get("Student_Id"),
@@ -166,17 +410,214 @@ async def verify_certificate(name: str, student_id: str) -> Dict[str, Any]:
         "certificate_id": certificate_id,
         "valid": True
     }
+    if certificate_signer is not None:
+        result["token"] = certificate_signer.token_for(student)
+    return result
+
+
+@app.get("/verify/token")
+async def verify_token(
+    token: str,
+    name: Optional[str] = Query(None, description="Name shown on the certificate, checked against the token"),
+) -> Dict[str, Any]:
+    """
+    Verify a signed certificate token without reading the roster
+
+    Only the signature is checked (pure CPU work, no file or CSV access),
+    so third parties can verify certificates at any volume. A token stays
+    valid until its signing secret is rotated out.
+
+    Args:
+        token: Token from the certificate's QR code or /verify
+        name: Optional name to check against the token's name hash
+
+    Returns:
+        Student ID, event code and certificate ID the token was issued for
+
+    Raises:
+        HTTPException: If tokens are not configured (503), or the token is
+            invalid or doesn't match the name (404)
+    """
+    if certificate_signer is None:
+        raise HTTPException(status_code=503, detail="Certificate tokens are not configured (set CERT_TOKEN_SECRET)")
+
+    claims = certificate_signer.verify(token)
+    if claims is None:
+        raise HTTPException(status_code=404, detail="Invalid certificate token")
+    if name is not None and not certificate_signer.name_matches(claims, name):
+        raise HTTPException(status_code=404, detail="Name does not match the certificate token")
+
+    return {
+        "student_id": claims.student_id,
+        "code": claims.code,
+        "certificate_id": csv_handler.generate_certificate_id(claims.student_id),
+        "name_verified": name is not None,
+        "valid": True,
+    }
+
+
+
+# Max (name, student_id) pairs accepted by one /verify/bulk request
+BULK_VERIFY_MAX_ITEMS = int(os.getenv("BULK_VERIFY_MAX_ITEMS", "100000"))
+_BULK_VERIFY_BATCH = 1000
+_NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+_NDJSON_MAX_LINE = 64 * 1024
+
+
+class _BadItem(Exception):
+    pass
+
+
+async def _read_ndjson(request: Request) -> List[Any]:
+    # Parse lines as they arrive, so the raw body is never held whole. The
+    # body must be consumed before the response starts: StreamingResponse
+    # listens for the client disconnecting on the same receive channel.
+    items: List[Any] = []
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                items.append(_parse_ndjson_line(line))
+        if len(buffer) > _NDJSON_MAX_LINE:
+            raise HTTPException(status_code=400, detail=f"NDJSON line longer than {_NDJSON_MAX_LINE} bytes")
+        if len(items) > BULK_VERIFY_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {BULK_VERIFY_MAX_ITEMS} items per request")
+    if buffer.strip():
+        items.append(_parse_ndjson_line(buffer))
+    if len(items) > BULK_VERIFY_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_VERIFY_MAX_ITEMS} items per request")
+    return items
+
+
+def _parse_ndjson_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return _BadItem(f"invalid JSON: {e}")
+
+
+def _bulk_pair(item: Any) -> tuple:
+    # {"name": ..., "student_id": ...} or ["name", "student_id"]
+    if isinstance(item, _BadItem):
+        raise item
+    if isinstance(item, dict):
+        name, student_id = item.get("name"), item.get("student_id")
+    elif isinstance(item, (list, tuple)) and len(item) == 2:
+        name, student_id = item
+    else:
+        raise _BadItem("expected {\"name\": ..., \"student_id\": ...}")
+    if not isinstance(name, str) or not name.strip():
+        raise _BadItem("name is required")
+    if isinstance(student_id, int) and not isinstance(student_id, bool):
+        student_id = str(student_id)
+    if not isinstance(student_id, str) or not student_id.strip():
+        raise _BadItem("student_id is required")
+    return name, student_id
 
 
+def _bulk_results(snap: RosterSnapshot, batch: List[tuple]) -> str:
+    # batch: (index, pair or _BadItem)
+    pairs = [pair for _, pair in batch if not isinstance(pair, _BadItem)]
+    found = snap.find_many(pairs)
+    lines = []
+    for index, pair in batch:
+        if isinstance(pair, _BadItem):
+            result = {"index": index, "status": "invalid", "error": str(pair)}
+        else:
+            student = next(found)
+            if student is None:
+                result = {"index": index, "status": "not_found", "name": pair[0], "student_id": pair[1]}
+            else:
+                result = {
+                    "index": index,
+                    "status": "valid",
+                    "name": student.get("Name"),
+                    "email": student.get("Email_id"),
+                    "student_id": student.get("Student_Id"),
+                    "course": student.get("Course"),
+                    "certificate_id": csv_handler.generate_certificate_id(student.get("Student_Id")),
+                }
+        lines.append(json.dumps(result, ensure_ascii=False))
+    return "\n".join(lines) + "\n"
+
+
+@app.post("/verify/bulk")
+async def verify_bulk(request: Request) -> StreamingResponse:
+    """
+    Verify many students in one request
+
+    Accepts a JSON array (or `{"items": [...]}`) or NDJSON
+    (`Content-Type: application/x-ndjson`) of `{"name", "student_id"}`
+    objects, normalized like /verify. Every item is resolved against the
+    same roster snapshot, and results stream back as NDJSON, one line per
+    item with its `index` and a `status` of valid, not_found or invalid.
+
+    Args:
+        request: Request carrying the JSON or NDJSON body
+
+    Returns:
+        NDJSON stream of per-item results
+
+    Raises:
+        HTTPException: If the body isn't valid JSON, has too many items,
+            or the student database is unavailable
+    """
+    try:
+        snap = await _roster_snapshot()
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Student database CSV not available: {str(e)}",
+        )
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in _NDJSON_TYPES:
+        items = await _read_ndjson(request)
+    else:
+        try:
+            data = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+        if isinstance(data, dict):
+            data = data.get("items")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail='Expected a JSON array or {"items": [...]}')
+        if len(data) > BULK_VERIFY_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {BULK_VERIFY_MAX_ITEMS} items per request")
+        items = data
+
+    async def results() -> AsyncIterator[str]:
+        # One chunk per batch; yielding lets other requests run in between.
+        # SQLite-backed lookups run on the roster pool instead of the loop.
+        for start in range(0, len(items), _BULK_VERIFY_BATCH):
+            batch: List[tuple] = []
+            for index in range(start, min(start + _BULK_VERIFY_BATCH, len(items))):
+                try:
+                    batch.append((index, _bulk_pair(items[index])))
+                except _BadItem as e:
+                    batch.append((index, e))
+            if csv_handler.in_memory:
+                yield _bulk_results(snap, batch)
+            else:
+                yield await _run_blocking(roster_executor, _bulk_results, snap, batch)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 
 @app.get("/certificate")
 async def get_certificate(
+    request: Request,
     name: str,
     student_id: str,
     force: bool = Query(False, description="Regenerate the certificate PDF even if it already exists"),
 ):
     """
     Generate certificate if not exists and return as downloadable PDF
+
+    Responses carry a content-hash ETag: `If-None-Match` gets a 304 and
+    `Range` requests are served as 206 so interrupted downloads can resume.
     
     Args:
         name: The student's name
@@ -186,11 +627,14 @@ async def get_certificate(
         PDF file as download
         
     Raises:
-        HTTPException: If student not found in database
+        HTTPException: If student not found in database (404), the client is
+            rate limited (429) or the render queue is full (503, with Retry-After)
     """
+    _check_rate_limit(certificate_rate_limit, request)
+
     # Verify student exists
     try:
-        student = csv_handler.find_student_by_name_and_id(name, student_id)
+        student = await _find_student(name, student_id)
     except FileNotFoundError as e:
         raise HTTPException(
             status_code=503,
@@ -211,81 +655,436 @@ async def get_certificate(
     # Generate certificate ID
     certificate_id = csv_handler.generate_certificate_id(student.get("Student_Id"))
     
-    # Render/WebService: cache PDFs on disk
-    if force or (not cert_generator.certificate_exists(certificate_id)):
+    # The student's event code selects the template
+    generator = template_registry.generator_for(student.get("Code"))
+    qr_data = _qr_data(student)
+
+    # Render/WebService: cache PDFs on disk, re-rendering stale ones lazily.
+    # A second pass covers a PDF evicted between the check and the open.
+    for attempt in range(2):
+        meta = None if force else generator.current_certificate_meta(student.get("Name"), certificate_id, qr_data)
+        if not attempt:
+            metrics.inc("certificate_cache_misses_total" if meta is None else "certificate_cache_hits_total")
+        if meta is None:
+            try:
+                await _ensure_certificate(generator, student.get("Name"), certificate_id, force, qr_data)
+            except AdmissionRejected as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Too many certificates are being generated right now; estimated wait {e.estimated_wait:.0f}s",
+                    headers={"Retry-After": str(e.retry_after)},
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error generating certificate: {str(e)}")
+            meta = generator.current_certificate_meta(student.get("Name"), certificate_id, qr_data) or {}
+
+        cert_path = generator.get_certificate_path(certificate_id)
         try:
-            cert_generator.generate_certificate(
-                student_name=student.get("Name"),
-                certificate_id=certificate_id,
+            if meta.get("sha256"):
+                etag = f'"{meta["sha256"][:32]}"'
+            else:
+                st = os.stat(cert_path)
+                etag = f'W/"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+            response = file_response(
+                request,
+                cert_path,
+                etag=etag,
+                media_type="application/pdf",
+                filename=f"{certificate_id}.pdf",
+                cache_control=CERT_CACHE_CONTROL,
             )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error generating certificate: {str(e)}")
+        except FileNotFoundError:
+            if attempt:
+                raise HTTPException(status_code=500, detail="Certificate file disappeared while serving it")
+            force = False
+            continue
 
-    cert_path = cert_generator.get_certificate_path(certificate_id)
-    return FileResponse(path=cert_path, media_type="application/pdf", filename=f"{certificate_id}.pdf")
+        generator.record_download(certificate_id)
+        return response
+
+
+def _require_admin(admin_key: str) -> None:
+    # Verify admin key (only enforced if ADMIN_KEY is set)
+    if ADMIN_KEY and admin_key != ADMIN_KEY:
+        raise HTTPException(
+            status_code=403,
+            detail="Invalid admin key"
+        )
 
 
 @app.get("/generate-all")
-async def generate_all_certificates(admin_key: str = Query(..., description="Admin key for authorization")) -> Dict[str, Any]:
+async def generate_all_certificates(
+    admin_key: str = Query(..., description="Admin key for authorization"),
+    full: bool = Query(False, description="Ignore the last run's manifest and check every student"),
+) -> Dict[str, Any]:
     """
     Admin endpoint to generate all certificates from CSV
     Protected by admin key
+
+    The roster is compared with the manifest of the last run: only new
+    students and students whose name, event code or template changed are
+    rendered, and PDFs of students no longer in the roster are deleted.
+    Rendering runs as a background job on a process pool; poll
+    `/jobs/{job_id}` for progress.
     
     Args:
         admin_key: Admin authorization key
+        full: Queue every student (cached PDFs that are current are still skipped)
         
     Returns:
-        Summary of generated certificates
+        The started job's ID, initial status and added/changed/removed/unchanged counts
         
     Raises:
-        HTTPException: If admin key is invalid or generation fails
+        HTTPException: If admin key is invalid or the roster can't be read
     """
-    # Verify admin key (only enforced if ADMIN_KEY is set)
-    if ADMIN_KEY and admin_key != ADMIN_KEY:
-        raise HTTPException(
-            status_code=403,
-            detail="Invalid admin key"
-        )
+    _require_admin(admin_key)
     
     try:
-        students = csv_handler.get_all_students()
-        generated = []
-        skipped = []
-        
-        for student in students:
-            student_id = student.get("Student_Id")
-            name = student.get("Name")
-            
-            # Generate certificate ID
-            certificate_id = csv_handler.generate_certificate_id(student_id)
-            
-            # Skip if already exists
-            if cert_generator.certificate_exists(certificate_id):
-                skipped.append(certificate_id)
-                continue
-            
-            # Generate certificate
-            cert_generator.generate_certificate(
-                student_name=name,
-                certificate_id=certificate_id
-            )
-            generated.append(certificate_id)
-        
-        return {
-            "success": True,
-            "total_students": len(students),
-            "generated": len(generated),
-            "skipped": len(skipped),
-            "generated_ids": generated,
-            "skipped_ids": skipped
-        }
-        
+        students, diff = await _run_blocking(roster_executor, _diff_roster)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error generating certificates: {str(e)}"
         )
 
+    if full:
+        queued = set(diff.entries)
+    else:
+        queued = set(diff.added) | set(diff.changed)
+    tasks = []
+    for student in students:
+        certificate_id = csv_handler.generate_certificate_id(student.get("Student_Id"))
+        if certificate_id in queued:
+            queued.discard(certificate_id)
+            tasks.append(
+                RenderTask(
+                    name=student.get("Name"),
+                    certificate_id=certificate_id,
+                    code=student.get("Code") or "",
+                    qr_data=_qr_data(student),
+                )
+            )
+
+    job = batch_jobs.submit(tasks, on_finish=functools.partial(_save_manifest, diff))
+    job.details["changes"] = diff.summary()
+
+    return {
+        "success": True,
+        "total_students": len(students),
+        "changes": diff.summary(),
+        "job_id": job.job_id,
+        "status_url": f"/jobs/{job.job_id}",
+        "job": job.to_dict(),
+    }
+
+
+def _diff_roster() -> Tuple[List[Dict[str, str]], ManifestDiff]:
+    """Read the roster, diff it against the manifest and delete removed students' PDFs."""
+    students = csv_handler.get_all_students()
+    diff = render_manifest.diff(
+        students, csv_handler.generate_certificate_id, template_registry.generator_for, _qr_data
+    )
+    # An empty roster is more likely a broken export than everyone leaving.
+    if students:
+        for certificate_id in diff.removed:
+            cert_generator.cache.discard(certificate_id)
+    return students, diff
+
+
+def _save_manifest(diff: ManifestDiff, job: BatchJob) -> None:
+    if not diff.entries:
+        return
+    render_manifest.save(diff.merged(job.generated + job.skipped))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, admin_key: str = Query(..., description="Admin key for authorization")) -> Dict[str, Any]:
+    """
+    Report progress of a batch generation job
+
+    Args:
+        job_id: ID returned by /generate-all
+        admin_key: Admin authorization key
+
+    Returns:
+        Done, failed and remaining counts, throughput and ETA
+    """
+    _require_admin(admin_key)
+
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, admin_key: str = Query(..., description="Admin key for authorization")) -> Dict[str, Any]:
+    """
+    Cancel a batch generation job
+
+    Certificates already being rendered finish; nothing new is started.
+
+    Args:
+        job_id: ID returned by /generate-all
+        admin_key: Admin authorization key
+
+    Returns:
+        The job's status after the cancel request
+    """
+    _require_admin(admin_key)
+
+    job = batch_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_dict()
+
+
+@app.get("/admin/export")
+async def export_certificates(
+    admin_key: str = Query(..., description="Admin key for authorization"),
+    format: str = Query("zip", pattern="^(zip|pdf)$", description="zip: one PDF per student; pdf: one merged PDF"),
+    code: Optional[str] = Query(None, description="Only students with this event code"),
+):
+    """
+    Stream every certificate of the roster (or of one event) as a download
+
+    The response is produced chunk by chunk and never buffered whole. For a
+    ZIP, cached PDFs are sent as-is and missing ones are rendered on the
+    batch process pool while the archive streams. A merged PDF embeds each
+    template once and adds a small name overlay per page.
+
+    Args:
+        admin_key: Admin authorization key
+        format: "zip" or "pdf"
+        code: Event code filter
+
+    Returns:
+        Streaming ZIP or PDF download
+
+    Raises:
+        HTTPException: If the roster can't be read or no student matches
+    """
+    _require_admin(admin_key)
+
+    try:
+        students = await _run_blocking(roster_executor, csv_handler.get_all_students)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading student database: {str(e)}")
+
+    wanted = normalize_code(code) if code else None
+    tasks: List[RenderTask] = []
+    seen = set()
+    for student in students:
+        if wanted is not None and normalize_code(student.get("Code")) != wanted:
+            continue
+        certificate_id = csv_handler.generate_certificate_id(student.get("Student_Id"))
+        if certificate_id in seen:
+            continue
+        seen.add(certificate_id)
+        tasks.append(
+            RenderTask(
+                name=student.get("Name"),
+                certificate_id=certificate_id,
+                code=student.get("Code") or "",
+                qr_data=_qr_data(student),
+            )
+        )
+
+    if not tasks:
+        raise HTTPException(status_code=404, detail="No students to export")
+
+    stem = "certificates" + ("-" + "".join(ch for ch in wanted if ch.isalnum() or ch in "-_") if wanted else "")
+    if format == "pdf":
+        body = stream_merged_pdf(tasks, batch_jobs)
+        media_type, filename = "application/pdf", f"{stem}.pdf"
+    else:
+        body = stream_zip(iter_certificate_files(tasks, batch_jobs))
+        media_type, filename = "application/zip", f"{stem}.zip"
+
+    # Sync iterators run on Starlette's thread pool, off the event loop.
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _require_email() -> DistributionManager:
+    if email_distribution is None:
+        raise HTTPException(status_code=503, detail="Email distribution is not configured (set SMTP_HOST)")
+    return email_distribution
+
+
+@app.post("/admin/email/distribute")
+async def distribute_certificates(
+    admin_key: str = Query(..., description="Admin key for authorization"),
+    code: Optional[str] = Query(None, description="Only students with this event code"),
+    resend: bool = Query(False, description="Also mail students who were already sent their certificate"),
+) -> Dict[str, Any]:
+    """
+    Mail every student their certificate as a background job
+
+    Missing certificates are rendered on the batch process pool; the PDFs
+    are sent over a pool of persistent SMTP connections, retrying temporary
+    failures with backoff. Each recipient's outcome is recorded, so a
+    re-run only mails students not sent yet (or whose address changed).
+
+    Args:
+        admin_key: Admin authorization key
+        code: Event code filter
+        resend: Ignore the delivery log and mail everyone
+
+    Returns:
+        The started job's ID and initial status, and how many students have no address
+
+    Raises:
+        HTTPException: If email is not configured, the roster can't be read
+            or no student has an address
+    """
+    _require_admin(admin_key)
+    distribution = _require_email()
+
+    try:
+        students = await _run_blocking(roster_executor, csv_handler.get_all_students)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading student database: {str(e)}")
+
+    wanted = normalize_code(code) if code else None
+    tasks: List[EmailTask] = []
+    seen = set()
+    no_email = 0
+    for student in students:
+        if wanted is not None and normalize_code(student.get("Code")) != wanted:
+            continue
+        certificate_id = csv_handler.generate_certificate_id(student.get("Student_Id"))
+        if certificate_id in seen:
+            continue
+        seen.add(certificate_id)
+        email = (student.get("Email_id") or "").strip()
+        if "@" not in email:
+            no_email += 1
+            continue
+        tasks.append(
+            EmailTask(student.get("Name"), certificate_id, email, student.get("Code") or "", _qr_data(student))
+        )
+
+    if not tasks:
+        raise HTTPException(status_code=404, detail="No students with an email address")
+
+    job = distribution.submit(tasks, resend=resend)
+    return {
+        "success": True,
+        "recipients": len(tasks),
+        "no_email": no_email,
+        "job_id": job.job_id,
+        "status_url": f"/admin/email/jobs/{job.job_id}",
+        "job": job.to_dict(),
+    }
+
+
+@app.get("/admin/email/jobs/{job_id}")
+async def get_distribution_status(
+    job_id: str, admin_key: str = Query(..., description="Admin key for authorization")
+) -> Dict[str, Any]:
+    """
+    Report progress of an email distribution job
+
+    Args:
+        job_id: ID returned by /admin/email/distribute
+        admin_key: Admin authorization key
+
+    Returns:
+        Sent, skipped, failed and remaining counts, retries, throughput and
+        ETA, plus delivery totals across all runs
+    """
+    _require_admin(admin_key)
+    distribution = _require_email()
+
+    job = distribution.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return {**job.to_dict(), "deliveries": await _run_blocking(roster_executor, distribution.log.stats)}
+
+
+@app.post("/admin/email/jobs/{job_id}/cancel")
+async def cancel_distribution(
+    job_id: str, admin_key: str = Query(..., description="Admin key for authorization")
+) -> Dict[str, Any]:
+    """
+    Cancel an email distribution job
+
+    Messages already being sent finish; nothing new is started.
+
+    Args:
+        job_id: ID returned by /admin/email/distribute
+        admin_key: Admin authorization key
+
+    Returns:
+        The job's status after the cancel request
+    """
+    _require_admin(admin_key)
+    distribution = _require_email()
+
+    job = distribution.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_dict()
+
+
+@app.get("/admin/render-plan")
+async def get_render_plan(
+    admin_key: str = Query(..., description="Admin key for authorization"),
+    code: Optional[str] = Query(None, description="Event code (default template if omitted)"),
+) -> Dict[str, Any]:
+    """
+    Show the compiled layout plan used for new certificates
+
+    Args:
+        admin_key: Admin authorization key
+        code: Event code whose template plan to show
+
+    Returns:
+        Resolved layout settings and the plan fingerprint
+    """
+    _require_admin(admin_key)
+    generator = template_registry.generator_for(code)
+    plan = await _run_blocking(render_executor, generator.render_plan)
+    return plan.describe()
+
+
+@app.post("/admin/render-plan")
+async def rebuild_render_plan(
+    admin_key: str = Query(..., description="Admin key for authorization"),
+    code: Optional[str] = Query(None, description="Event code (default template if omitted)"),
+    overrides: Optional[Dict[str, Any]] = Body(None, description="CERT_NAME_* settings to apply over the environment"),
+) -> Dict[str, Any]:
+    """
+    Rebuild one template's layout plan, optionally replacing its layout overrides
+
+    Overrides are written to that template's layout file (CERT_LAYOUT_FILE,
+    or `.layout.<CODE>.json` beside it for an event), so every worker picks
+    them up on its next render without a restart. They apply over the
+    environment and the registry's layout for the event; other events are
+    unaffected. Certificates rendered with the previous layout become stale
+    and are re-rendered on their next download.
+
+    Args:
+        admin_key: Admin authorization key
+        code: Event code whose template to change (unknown codes use the default template)
+        overrides: New overrides (replaces the previous set); omit to rebuild only
+
+    Returns:
+        The new plan
+    """
+    _require_admin(admin_key)
+    generator = template_registry.generator_for(code)
+    try:
+        plan = await _run_blocking(render_executor, generator.update_layout_overrides, overrides)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid layout settings: {e}")
+    return plan.describe()
+
 
 # Run with: uvicorn app.main:app --reload
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""
+Metrics Module
+Phase timings and counters for the lookup and render paths, in Prometheus text format
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the phase histogram buckets
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = {
+    "certificate_cache_hits_total": "Certificate downloads served from a current cached PDF",
+    "certificate_cache_misses_total": "Certificate downloads that needed a render",
+    "certificate_renders_total": "Certificates rendered by this process",
+    "certificate_bytes_written_total": "Bytes of PDF written by this process",
+}
+
+# (name, seconds) of the phases run for the current request, when Server-Timing is on
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+_NOOP = nullcontext()
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class _Phase:
+    __slots__ = ("_metrics", "_key", "_start")
+
+    def __init__(self, metrics: "Metrics", key: Tuple[str, str]):
+        self._metrics = metrics
+        self._key = key
+
+    def __enter__(self) -> None:
+        self._start = perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        self._metrics.observe(self._key, perf_counter() - self._start)
+
+
+class Metrics:
+    """Per-process histograms of phase durations plus a few counters."""
+
+    def __init__(self, enabled: bool):
+        """
+        Initialize the registry
+
+        Args:
+            enabled: Record histograms and counters; when False, phase() is a
+                shared no-op unless the request collects Server-Timing
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], _Histogram] = {}
+        self._counters: Dict[str, float] = dict.fromkeys(COUNTERS, 0)
+
+    def phase(self, path: str, name: str) -> Any:
+        """
+        Time a block as one phase of a path
+
+            with metrics.phase("render", "draw"):
+                ...
+
+        Args:
+            path: Code path ("roster", "render")
+            name: Phase within the path
+
+        Returns:
+            Context manager (a no-op when nothing would record it)
+        """
+        if not self.enabled and _request_timings.get() is None:
+            return _NOOP
+        return _Phase(self, (path, name))
+
+    def observe(self, key: Tuple[str, str], seconds: float) -> None:
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((f"{key[0]}.{key[1]}", seconds))
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Add to one of COUNTERS."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] += value
+
+    def render(self) -> str:
+        """
+        Everything recorded so far, in the Prometheus text exposition format
+
+        Returns:
+            Exposition text (version 0.0.4)
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = [
+                (key, list(h.counts), h.total, h.count) for key, h in sorted(self._histograms.items())
+            ]
+
+        lines = []
+        for name, help_text in COUNTERS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {counters[name]:g}"]
+
+        name = "certificate_phase_seconds"
+        lines += [f"# HELP {name} Time spent in each phase of the lookup and render paths", f"# TYPE {name} histogram"]
+        for (path, phase), counts, total, count in histograms:
+            labels = f'path="{path}",phase="{phase}"'
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "0").strip().lower() in ("1", "true", "yes")
+
+
+metrics = Metrics(enabled=_env_flag("METRICS_ENABLED"))
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a `Server-Timing` header with the request's phase durations."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and timings:
+                # Phases repeated within a request (e.g. two lookups) are summed.
+                totals: Dict[str, float] = {}
+                for name, seconds in timings:
+                    totals[name] = totals.get(name, 0.0) + seconds
+                value = ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
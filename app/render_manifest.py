@@ -0,0 +1,171 @@
+"""
+Render Manifest Module
+Remembers what the last batch run rendered, so the next run only renders what changed
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from app.certificate_generator import CertificateGenerator, RenderPlan
+from app.template_registry import normalize_code
+
+MANIFEST_FILENAME = ".render-manifest.json"
+
+_VERSION = 1
+
+
+class ManifestDiff(NamedTuple):
+    """Roster compared against the manifest, by certificate ID."""
+
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: List[str]
+    # certificate ID -> entry hash for every student in the roster
+    entries: Dict[str, str]
+    # The manifest the roster was compared against
+    previous: Dict[str, str]
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+            "unchanged": len(self.unchanged),
+        }
+
+    def merged(self, rendered: Iterable[str]) -> Dict[str, str]:
+        """
+        Manifest to save after a run
+
+        Certificates that weren't rendered (failed or cancelled) keep their
+        previous entry, so the next run picks them up again.
+
+        Args:
+            rendered: Certificate IDs now current on disk
+
+        Returns:
+            certificate ID -> entry hash
+        """
+        done = set(rendered)
+        result: Dict[str, str] = {}
+        for certificate_id, digest in self.entries.items():
+            if certificate_id in done or self.previous.get(certificate_id) == digest:
+                result[certificate_id] = digest
+            elif certificate_id in self.previous:
+                result[certificate_id] = self.previous[certificate_id]
+        return result
+
+
+def entry_hash(code: str, name_fingerprint: str) -> str:
+    """Manifest value for a student: event code plus RenderPlan.name_fingerprint()."""
+    return hashlib.sha1(f"{code}\n{name_fingerprint}".encode("utf-8")).hexdigest()
+
+
+class RenderManifest:
+    """JSON map of certificate ID -> entry hash, stored next to the cached PDFs."""
+
+    def __init__(self, output_dir: str):
+        """
+        Initialize the manifest
+
+        The file lives in the certificate directory, so clearing that
+        directory also forgets what was rendered.
+
+        Args:
+            output_dir: Certificate output directory
+        """
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, str]:
+        """
+        Read the manifest
+
+        Returns:
+            certificate ID -> entry hash (empty if missing or unreadable)
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != _VERSION:
+            return {}
+        entries = data.get("entries")
+        return entries if isinstance(entries, dict) else {}
+
+    def save(self, entries: Dict[str, str]) -> None:
+        """Replace the manifest atomically."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".render-manifest.", suffix=".tmp", dir=os.path.dirname(self.path))
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": _VERSION, "entries": entries}, f, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+    def diff(
+        self,
+        students: Iterable[Dict[str, str]],
+        certificate_id_for: Callable[[str], str],
+        generator_for: Callable[[str], CertificateGenerator],
+        qr_data_for: Optional[Callable[[Dict[str, str]], str]] = None,
+    ) -> ManifestDiff:
+        """
+        Compare the roster with the last run in one pass
+
+        A student is "changed" when their name, event code, QR content or
+        anything in their template's render plan (template, font, layout)
+        differs from the last run. Duplicate student IDs keep their first row, as
+        lookups do.
+
+        Args:
+            students: Roster rows (get_all_students() output)
+            certificate_id_for: Maps a Student_Id to its certificate ID
+            generator_for: Maps an event code to its generator
+            qr_data_for: Maps a roster row to its QR content (None: no QR codes)
+
+        Returns:
+            The diff, including the new entries to save once rendered
+        """
+        previous = self.load()
+        # One plan per event code: render_plan() stats the template and layout file.
+        plans: Dict[str, RenderPlan] = {}
+        added: List[str] = []
+        changed: List[str] = []
+        unchanged: List[str] = []
+        entries: Dict[str, str] = {}
+
+        for student in students:
+            certificate_id = certificate_id_for(student.get("Student_Id"))
+            if certificate_id in entries:
+                continue
+            code = normalize_code(student.get("Code"))
+            plan = plans.get(code)
+            if plan is None:
+                plan = plans[code] = generator_for(code).render_plan()
+
+            qr_data = qr_data_for(student) if qr_data_for is not None else ""
+            digest = entry_hash(code, plan.name_fingerprint(student.get("Name"), qr_data))
+            entries[certificate_id] = digest
+            old = previous.get(certificate_id)
+            if old is None:
+                added.append(certificate_id)
+            elif old != digest:
+                changed.append(certificate_id)
+            else:
+                unchanged.append(certificate_id)
+
+        removed = [certificate_id for certificate_id in previous if certificate_id not in entries]
+        return ManifestDiff(added, changed, removed, unchanged, entries, previous)
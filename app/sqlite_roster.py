@@ -0,0 +1,445 @@
+"""
+SQLite Roster Module
+CSVHandler-compatible roster backed by an indexed SQLite copy of the CSV
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.csv_handler import CSVHandler
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Canonical fields, in FIELD_ALIASES order, and their column names
+_FIELDS = tuple(CSVHandler.FIELD_ALIASES)
+_COLUMNS = ("name", "student_id", "email", "course", "code")
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM students"
+
+# Read size when hashing the imported part of the CSV
+_HASH_CHUNK = 1 << 20
+
+_INSERT_BATCH = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    seq INTEGER PRIMARY KEY,
+    row_hash BLOB NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    course TEXT NOT NULL,
+    code TEXT NOT NULL,
+    norm_name TEXT NOT NULL,
+    norm_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS students_key ON students(norm_name, norm_id, seq);
+CREATE INDEX IF NOT EXISTS students_id ON students(norm_id, seq);
+CREATE TABLE IF NOT EXISTS import_state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+assert len(_FIELDS) == len(_COLUMNS)
+
+
+def _row_to_student(row: Tuple[str, ...]) -> Dict[str, str]:
+    return dict(zip(_FIELDS, row))
+
+
+class SQLiteRosterSnapshot:
+    """Read view over the imported roster; same lookups as RosterSnapshot."""
+
+    def __init__(self, handler: "SQLiteRosterHandler", signature: Tuple[str, int, int]):
+        self._handler = handler
+        # (path, mtime_ns, size) of the CSV this view was imported from
+        self.signature = signature
+
+    @property
+    def students(self) -> List[Dict[str, str]]:
+        """All students in file order (loads the whole roster; admin use only)."""
+        with self._handler.connection() as conn:
+            return [_row_to_student(row) for row in conn.execute(f"{_SELECT} ORDER BY seq")]
+
+    def find(self, name: str, student_id: str) -> Optional[Dict[str, str]]:
+        """Indexed lookup by normalized name and student ID."""
+        with metrics.phase("roster", "lookup"), self._handler.connection() as conn:
+            return self._find(conn, name, student_id)
+
+    @staticmethod
+    def _find(conn: sqlite3.Connection, name: str, student_id: str) -> Optional[Dict[str, str]]:
+        row = conn.execute(
+            f"{_SELECT} WHERE norm_name = ? AND norm_id = ? ORDER BY seq LIMIT 1",
+            (CSVHandler._normalize_name(name), CSVHandler._normalize_student_id(student_id)),
+        ).fetchone()
+        return _row_to_student(row) if row else None
+
+    def find_by_id(self, student_id: str) -> Optional[Dict[str, str]]:
+        """Indexed lookup by normalized student ID."""
+        with self._handler.connection() as conn:
+            row = conn.execute(
+                f"{_SELECT} WHERE norm_id = ? ORDER BY seq LIMIT 1",
+                (CSVHandler._normalize_student_id(student_id),),
+            ).fetchone()
+        return _row_to_student(row) if row else None
+
+    def find_many(self, pairs: Iterable[Tuple[str, str]]) -> Iterator[Optional[Dict[str, str]]]:
+        """Look up many pairs on one connection inside one read transaction."""
+        pairs = list(pairs)
+        with self._handler.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                results = [self._find(conn, name, student_id) for name, student_id in pairs]
+            finally:
+                conn.execute("COMMIT")
+        return iter(results)
+
+
+class SQLiteRosterHandler(CSVHandler):
+    """
+    Roster served from SQLite, kept in sync with the CSV
+
+    The CSV stays the source of truth. When it changes, rows appended since
+    the last import are added; any other edit triggers a full re-import in
+    one transaction. Readers never parse the CSV, and a restart with an
+    unchanged CSV costs one query.
+    """
+
+    # Lookups query SQLite and may wait for a pooled connection.
+    in_memory = False
+
+    def __init__(self, csv_path: str = "students.csv", db_path: Optional[str] = None, pool_size: int = 4):
+        """
+        Initialize the handler
+
+        Args:
+            csv_path: Path to the CSV file containing student data
+            db_path: SQLite file (default: next to the CSV, `<csv>.sqlite3`)
+            pool_size: Read connections kept open
+        """
+        super().__init__(csv_path)
+        self.db_path = db_path or f"{self.csv_path}.sqlite3"
+        self.pool_size = max(1, pool_size)
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+        self._opened = 0
+        # Signature of the CSV the database was last synced with
+        self._imported: Optional[Tuple[str, int, int]] = None
+
+    # Connections
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read connection from the pool (thread-safe; blocks when all are in use)."""
+        with self._pool_lock:
+            if self._pool_pid != os.getpid():
+                # Connections must not cross a fork (gunicorn --preload).
+                self._pool = queue.LifoQueue()
+                self._opened = 0
+                self._pool_pid = os.getpid()
+            pool = self._pool
+            conn = None
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                if self._opened < self.pool_size:
+                    self._opened += 1
+                    conn = self._connect()
+        if conn is None:
+            conn = pool.get()
+        try:
+            yield conn
+        finally:
+            pool.put(conn)
+
+    # Import
+
+    def _signature(self) -> Tuple[str, int, int]:
+        st = self._stat_csv()
+        return (self.csv_path, st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def _encode_signature(signature: Tuple[str, int, int]) -> str:
+        return json.dumps(list(signature))
+
+    def _imported_signature(self) -> Optional[Tuple[str, int, int]]:
+        if self._imported is None:
+            try:
+                with self.connection() as conn:
+                    row = conn.execute("SELECT value FROM import_state WHERE key = 'signature'").fetchone()
+            except sqlite3.OperationalError:
+                # No schema yet
+                return None
+            if row and row[0]:
+                self._imported = tuple(json.loads(row[0]))  # type: ignore[assignment]
+        return self._imported
+
+    def snapshot(self) -> SQLiteRosterSnapshot:
+        """
+        Return a view of the roster, importing CSV changes first
+
+        Costs a single stat() when the database is in sync with the CSV.
+
+        Raises:
+            FileNotFoundError: If CSV file doesn't exist
+        """
+        signature = self._signature()
+        if self._imported_signature() != signature:
+            with self._reload_lock:
+                if self._imported_signature() != signature:
+                    with metrics.phase("roster", "import"):
+                        self._sync(signature)
+        return SQLiteRosterSnapshot(self, signature)
+
+    def cached_snapshot(self) -> Optional[SQLiteRosterSnapshot]:
+        """
+        Return a view if the database is in sync with the CSV, without importing
+
+        Returns:
+            The view, or None if the CSV changed since the last import
+
+        Raises:
+            FileNotFoundError: If CSV file doesn't exist
+        """
+        signature = self._signature()
+        if self._imported_signature() != signature:
+            return None
+        return SQLiteRosterSnapshot(self, signature)
+
+    def _sync(self, signature: Tuple[str, int, int]) -> None:
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+            # Serializes imports across worker processes.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = dict(conn.execute("SELECT key, value FROM import_state").fetchall())
+                if state.get("signature") == self._encode_signature(signature):
+                    # Another process imported this version while we waited.
+                    conn.execute("COMMIT")
+                    self._imported = signature
+                    return
+
+                path = signature[0]
+                offset = int(state.get("offset", "0"))
+                # Hash of every byte imported so far; an append leaves it unchanged.
+                prefix = hashlib.sha256()
+                appended = False
+                if state.get("path") == path and offset and signature[2] >= offset and state.get("prefix_hash"):
+                    with open(path, "rb") as f:
+                        self._hash_range(f, prefix, 0, offset)
+                    appended = prefix.hexdigest() == state["prefix_hash"]
+                if appended:
+                    header = json.loads(state["header"])
+                    added = self._import_rows(conn, signature, offset, header, prefix)
+                    logger.info("Roster %s: appended %d new rows", path, added)
+                else:
+                    prefix = hashlib.sha256()
+                    conn.execute("DELETE FROM students")
+                    header = self._read_header(path)
+                    if header is None:
+                        offset = 0
+                    else:
+                        plan = self.compile_header(header[0])
+                        self._report_header(path, header[0], plan)
+                        offset = header[1]
+                    added = self._import_rows(conn, signature, offset, header[0] if header else None, prefix, 0)
+                    logger.info("Roster %s: imported %d rows", path, added)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        self._imported = signature
+
+    @staticmethod
+    def _hash_range(f, hasher: "hashlib._Hash", start: int, end: int) -> None:
+        """Feed bytes [start, end) of a file to a hash, in bounded reads."""
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(_HASH_CHUNK, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+
+    @staticmethod
+    def _complete_end(f, size: int) -> int:
+        """Offset just past the last newline, so a half-written last row isn't imported."""
+        pos = size
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            block = f.read(pos - start)
+            idx = block.rfind(b"\n")
+            if idx != -1:
+                return start + idx + 1
+            pos = start
+        return 0
+
+    @staticmethod
+    def _read_header(path: str) -> Optional[Tuple[List[str], int]]:
+        with open(path, "rb") as f:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                return None
+            header = next(csv.reader([line.decode("utf-8-sig")]), None)
+            return (header, len(line)) if header else None
+
+    def _import_rows(
+        self,
+        conn: sqlite3.Connection,
+        signature: Tuple[str, int, int],
+        offset: int,
+        header: Optional[List[str]],
+        prefix: "hashlib._Hash",
+        hashed: Optional[int] = None,
+    ) -> int:
+        """
+        Import the complete rows from offset on and record the new import state
+
+        Args:
+            conn: Connection inside the import transaction
+            signature: Stat signature of the CSV being imported
+            offset: Byte offset of the first row to import
+            header: CSV header row, or None for an empty file
+            prefix: SHA-256 of the file's bytes before `hashed`; extended to
+                the new import offset and stored
+            hashed: Bytes already fed to prefix (default: offset)
+
+        Returns:
+            Rows added
+        """
+        path = signature[0]
+        with open(path, "rb") as f:
+            end = self._complete_end(f, os.fstat(f.fileno()).st_size)
+
+            if header is not None and end > offset:
+                plan = self.compile_header(header)
+                f.seek(offset)
+                lines = self._iter_lines(f, end - offset)
+                added = 0
+                batch: List[Tuple[Any, ...]] = []
+                for row in csv.reader(lines):
+                    if not row:
+                        continue
+                    width = len(row)
+                    values = []
+                    for _, indexes in plan:
+                        value = ""
+                        for idx in indexes:
+                            if idx < width:
+                                value = row[idx]
+                                break
+                        values.append(value)
+                    row_hash = hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=16).digest()
+                    batch.append(
+                        (row_hash, *values, self._normalize_name(values[0]), self._normalize_student_id(values[1]))
+                    )
+                    if len(batch) >= _INSERT_BATCH:
+                        added += self._insert(conn, batch)
+                        batch = []
+                if batch:
+                    added += self._insert(conn, batch)
+            else:
+                added = 0
+                end = max(end, offset)
+
+            self._hash_range(f, prefix, offset if hashed is None else hashed, end)
+
+        # The stat signature is only recorded if nothing was left unread, so
+        # a half-written last row is picked up on the next sync.
+        state = {
+            "path": path,
+            "offset": str(end),
+            "prefix_hash": prefix.hexdigest(),
+            "header": json.dumps(header or []),
+            "signature": self._encode_signature(signature) if end >= signature[2] else "",
+        }
+        conn.executemany("INSERT OR REPLACE INTO import_state VALUES (?, ?)", list(state.items()))
+        return added
+
+    @staticmethod
+    def _iter_lines(f, length: int) -> Iterator[str]:
+        remaining = length
+        for line in f:
+            if remaining <= 0:
+                break
+            line = line[:remaining]
+            remaining -= len(line)
+            yield line.decode("utf-8")
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: List[Tuple[Any, ...]]) -> int:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO students (row_hash, name, student_id, email, course, code, norm_name, norm_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        return conn.total_changes - before
+
+    # CSVHandler API
+
+    def get_all_students(self) -> List[Dict[str, str]]:
+        """
+        Read all students, in file order
+
+        Returns:
+            List of dictionaries containing student data
+
+        Raises:
+            FileNotFoundError: If CSV file doesn't exist
+        """
+        with metrics.phase("roster", "list"):
+            return self.snapshot().students
+
+    def validate_csv_structure(self) -> bool:
+        """
+        Validate that the roster has at least one student with the required columns
+
+        Returns:
+            True if the roster is usable, False otherwise
+        """
+        try:
+            self.snapshot()
+            with self.connection() as conn:
+                row = conn.execute(f"{_SELECT} ORDER BY seq LIMIT 1").fetchone()
+            return row is not None and bool(row[0]) and bool(row[1])
+        except Exception:
+            return False
+
+
+def roster_handler_from_env(csv_path: str) -> CSVHandler:
+    """
+    Build the roster backend selected by ROSTER_BACKEND (csv or sqlite)
+
+    Args:
+        csv_path: Path to the roster CSV
+
+    Returns:
+        A CSVHandler or SQLiteRosterHandler
+    """
+    backend = (os.getenv("ROSTER_BACKEND") or "csv").strip().lower()
+    if backend == "csv":
+        return CSVHandler(csv_path)
+    if backend == "sqlite":
+        db_path = (os.getenv("ROSTER_DB_PATH") or "").strip() or None
+        pool_size = int(os.getenv("ROSTER_DB_POOL_SIZE", "4"))
+        return SQLiteRosterHandler(csv_path, db_path=db_path, pool_size=pool_size)
+    raise ValueError(f"Unknown ROSTER_BACKEND: {backend!r} (expected 'csv' or 'sqlite')")
@@ -0,0 +1,208 @@
+"""
+Template Registry Module
+Maps roster event codes (the `Code` column) to certificate templates and layout settings
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.certificate_generator import CertificateGenerator
+
+
+def normalize_code(code: Optional[str]) -> str:
+    """Event codes are matched case-insensitively, ignoring surrounding spaces."""
+    return (code or "").strip().upper()
+
+
+class TemplateRegistry:
+    """One CertificateGenerator per event code, sharing a decoded-template memory budget."""
+
+    def __init__(
+        self,
+        default: CertificateGenerator,
+        config_path: Optional[str] = None,
+        memory_limit: int = 0,
+    ):
+        """
+        Initialize the registry
+
+        The config file is a JSON object keyed by event code. A value is either
+        a template path or an object with `template`, and optionally `layout`
+        (CERT_NAME_* settings) and `pdf_engine`:
+
+            {
+              "WORKSHOP1": "templates/workshop1.jpg",
+              "WORKSHOP2": {"template": "templates/workshop2.png",
+                            "layout": {"CERT_NAME_Y_RATIO": "0.55"}}
+            }
+
+        Args:
+            default: Generator used for students whose code isn't listed
+            config_path: Path to the JSON config (None: default template only)
+            memory_limit: Max bytes of decoded templates kept in memory
+                (0 = unlimited); least recently used templates are released
+
+        Raises:
+            FileNotFoundError: If the config file doesn't exist
+            ValueError: If the config is malformed
+        """
+        self.default = default
+        self.config_path = config_path
+        self.memory_limit = max(0, memory_limit)
+        self._generators: Dict[str, CertificateGenerator] = {}
+        # Most recently used last
+        self._recent: "OrderedDict[str, CertificateGenerator]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+        if config_path:
+            self._generators = self._load_config(config_path)
+
+    def _load_config(self, config_path: str) -> Dict[str, CertificateGenerator]:
+        with open(config_path, "r", encoding="utf-8") as f:
+            try:
+                config = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"Invalid template registry {config_path}: {e}")
+        if not isinstance(config, dict):
+            raise ValueError(f"Template registry {config_path} must be a JSON object")
+
+        base_dir = Path(config_path).resolve().parent
+        project_root = self.default._project_root
+        generators: Dict[str, CertificateGenerator] = {}
+        for raw_code, entry in config.items():
+            code = normalize_code(raw_code)
+            if not code:
+                raise ValueError("Template registry contains an empty event code")
+            if isinstance(entry, str):
+                entry = {"template": entry}
+            if not isinstance(entry, dict) or not entry.get("template"):
+                raise ValueError(f"Template registry entry {raw_code!r} needs a 'template' path")
+
+            layout = entry.get("layout") or {}
+            if not isinstance(layout, dict):
+                raise ValueError(f"Template registry entry {raw_code!r}: 'layout' must be an object")
+
+            # Relative paths: project root first (like the other env paths), then the config's folder
+            template = Path(str(entry["template"]).replace("\\", "/"))
+            if not template.is_absolute():
+                in_root = project_root / template
+                template = in_root if in_root.exists() else base_dir / template
+
+            generators[code] = CertificateGenerator(
+                template_path=str(template),
+                output_dir=self.default.output_dir,
+                pdf_engine=entry.get("pdf_engine") or self.default.pdf_engine,
+                layout_overrides={str(k): str(v) for k, v in layout.items()},
+                event_code=code,
+            )
+        return generators
+
+    @property
+    def codes(self) -> list:
+        return sorted(self._generators)
+
+    def generators(self) -> List[CertificateGenerator]:
+        """The default generator followed by the per-event ones."""
+        return [self.default] + [self._generators[code] for code in self.codes]
+
+    def generator_for(self, code: Optional[str]) -> CertificateGenerator:
+        """
+        Return the generator for an event code
+
+        Marks the template as recently used and releases the least recently
+        used decoded templates if the memory budget is exceeded.
+
+        Args:
+            code: The student's event code
+
+        Returns:
+            The event's generator, or the default one for unknown codes
+        """
+        key = normalize_code(code)
+        generator = self._generators.get(key)
+        if generator is None:
+            key, generator = "", self.default
+        if not self._generators:
+            return generator
+
+        with self._lock:
+            self._recent[key] = generator
+            self._recent.move_to_end(key)
+            if self.memory_limit:
+                self._enforce_limit(keep=generator)
+        return generator
+
+    def _enforce_limit(self, keep: CertificateGenerator) -> None:
+        # Budget for the template about to be used as if it were decoded
+        total = keep.template_memory(expected=True)
+        total += sum(g.template_memory() for g in self._recent.values() if g is not keep)
+        for generator in list(self._recent.values()):
+            if total <= self.memory_limit:
+                break
+            if generator is keep:
+                continue
+            used = generator.template_memory()
+            if used and generator.release_template():
+                total -= used
+                self.evictions += 1
+
+    def preload(self) -> None:
+        """
+        Decode templates ahead of the first request
+
+        With a memory limit, templates are decoded until the budget is used.
+        Missing template files are skipped and reported on first use.
+        """
+        for key, generator in [("", self.default)] + sorted(self._generators.items()):
+            try:
+                if self.memory_limit:
+                    # Reads the file header only; pixels are not decoded yet.
+                    generator.render_plan()
+                    if self.memory_usage() + generator.template_memory(expected=True) > self.memory_limit:
+                        break
+                generator.preload_template()
+            except Exception:
+                continue
+            with self._lock:
+                self._recent[key] = generator
+
+    def memory_usage(self) -> int:
+        generators = {id(g): g for g in [self.default, *self._generators.values()]}
+        return sum(g.template_memory() for g in generators.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Registry summary for /health."""
+        return {
+            "events": self.codes,
+            "decoded_bytes": self.memory_usage(),
+            "memory_limit": self.memory_limit,
+            "evictions": self.evictions,
+        }
+
+
+def registry_from_env(default: CertificateGenerator, project_root: Path) -> TemplateRegistry:
+    """
+    Build the registry from CERT_TEMPLATE_REGISTRY and CERT_TEMPLATE_CACHE_MB
+
+    Args:
+        default: Generator for CERTIFICATE_TEMPLATE_IMAGE
+        project_root: Base for a relative CERT_TEMPLATE_REGISTRY path
+
+    Returns:
+        The registry (default template only if CERT_TEMPLATE_REGISTRY is unset)
+    """
+    config = (os.getenv("CERT_TEMPLATE_REGISTRY") or "").strip()
+    config_path = None
+    if config:
+        p = Path(config.replace("\\", "/"))
+        if not p.is_absolute():
+            p = project_root / p
+        config_path = str(p)
+
+    limit_mb = float(os.getenv("CERT_TEMPLATE_CACHE_MB", "0") or 0)
+    return TemplateRegistry(default, config_path=config_path, memory_limit=int(limit_mb * 1024 * 1024))
@@ -0,0 +1,154 @@
+"""
+Warm-up Module
+Loads the roster, cache index, templates and fonts before a worker takes traffic, and optionally pre-renders certificates
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.csv_handler import CSVHandler
+from app.template_registry import TemplateRegistry
+
+logger = logging.getLogger(__name__)
+
+# Cache lock held by the worker that is pre-rendering
+_PRERENDER_LOCK = "prerender"
+
+# Seconds to sleep while on-demand renders are in progress
+_YIELD_INTERVAL = 0.5
+
+
+class Warmup:
+    """Startup warm-up steps and the optional background pre-render, with their status."""
+
+    def __init__(
+        self,
+        roster: CSVHandler,
+        registry: TemplateRegistry,
+        prerender: bool = False,
+        busy: Optional[Callable[[], bool]] = None,
+        qr_data_for: Optional[Callable[[Dict[str, str]], str]] = None,
+    ):
+        """
+        Initialize the warm-up
+
+        Args:
+            roster: Roster handler to index
+            registry: Templates to decode and whose fonts to load
+            prerender: Render missing certificates in the background once warm
+            busy: Returns True while on-demand renders are running; the
+                pre-render waits for it to turn False before each certificate
+            qr_data_for: Maps a roster row to its QR content (None: no QR codes)
+        """
+        self.roster = roster
+        self.registry = registry
+        self.prerender = prerender
+        self.busy = busy or (lambda: False)
+        self.qr_data_for = qr_data_for or (lambda student: "")
+        self.ready = False
+        self.steps: Dict[str, Any] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.prerender_status: Dict[str, Any] = {"status": "disabled" if not prerender else "pending"}
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        """
+        Run every warm-up step, then mark the worker ready
+
+        A failing step is logged and reported in status(); it doesn't keep
+        the worker from becoming ready, since requests would fail the same
+        way on a cold worker.
+        """
+        self.started_at = time.time()
+        self._step("roster", lambda: self.roster.snapshot())
+        # Opening the cache index may scan the certificates directory once.
+        self._step("certificate_cache", lambda: [g.cache.open() for g in self.registry.generators() if g.cache])
+        self._step("templates", self.registry.preload)
+        self._step("fonts", lambda: [g.warm_fonts() for g in self.registry.generators()])
+        self.finished_at = time.time()
+        self.ready = True
+        logger.info("Warm-up finished in %.2fs", self.finished_at - self.started_at)
+
+        if self.prerender and not self._stop.is_set():
+            threading.Thread(target=self._prerender, name="prerender", daemon=True).start()
+
+    def _step(self, name: str, fn: Callable[[], Any]) -> None:
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            self.steps[name] = {"ok": False, "error": str(e)}
+            return
+        self.steps[name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3)}
+
+    def _prerender(self) -> None:
+        # Below the event loop and on-demand render threads (Linux: per-thread nice).
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+        cache = self.registry.default.cache
+        if cache is None:
+            self.prerender_status = {"status": "disabled", "error": "no output directory"}
+            return
+        # One worker pre-renders; the others would only compete for the same locks.
+        with cache.named_lock(_PRERENDER_LOCK, blocking=False) as acquired:
+            if not acquired:
+                self.prerender_status = {"status": "skipped", "reason": "another worker is pre-rendering"}
+                return
+            self._prerender_all()
+
+    def _prerender_all(self) -> None:
+        status: Dict[str, Any] = {"status": "running", "rendered": 0, "current": 0, "failed": 0}
+        self.prerender_status = status
+        try:
+            students = self.roster.get_all_students()
+        except Exception as e:
+            self.prerender_status = {"status": "failed", "error": str(e)}
+            return
+
+        status["total"] = len(students)
+        seen = set()
+        for student in students:
+            if self._stop.is_set():
+                status["status"] = "stopped"
+                return
+            certificate_id = self.roster.generate_certificate_id(student.get("Student_Id"))
+            if certificate_id in seen:
+                continue
+            seen.add(certificate_id)
+
+            name = student.get("Name")
+            generator = self.registry.generator_for(student.get("Code"))
+            try:
+                qr_data = self.qr_data_for(student)
+                if generator.is_certificate_current(name, certificate_id, qr_data):
+                    status["current"] += 1
+                    continue
+                while self.busy() and not self._stop.is_set():
+                    self._stop.wait(_YIELD_INTERVAL)
+                generator.ensure_certificate(name, certificate_id, qr_data=qr_data)
+                status["rendered"] += 1
+            except Exception as e:
+                status["failed"] += 1
+                logger.warning("Pre-render of %s failed: %s", certificate_id, e)
+        status["status"] = "completed"
+
+    def stop(self) -> None:
+        """Stop the pre-render after the certificate in progress."""
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness, per-step results and pre-render progress for /health."""
+        return {
+            "ready": self.ready,
+            "steps": dict(self.steps),
+            "seconds": round(self.finished_at - self.started_at, 3) if self.finished_at and self.started_at else None,
+            "prerender": dict(self.prerender_status),
+        }
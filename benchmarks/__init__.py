@@ -0,0 +1 @@
+# Benchmarks for the Certificate Distribution System (run from the repo root)
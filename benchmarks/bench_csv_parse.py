@@ -0,0 +1,68 @@
+"""
+Benchmark roster parsing: per-row dict normalization vs compiled header mapping
+
+Usage:
+    python -m benchmarks.bench_csv_parse [--rows 100000] [--repeat 3]
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from app.csv_handler import CSVHandler
+from benchmarks.synthetic import write_roster
+
+
+def legacy_parse(handler: CSVHandler, path: str) -> List[Dict[str, str]]:
+    """The original DictReader + _get_first-per-field implementation."""
+    get = handler._get_first
+    students = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as file:
+        for row in csv.DictReader(file):
+            students.append({
+                "Name": get(row, ["Name", "Full Name", "Student Name"]),
+                "Student_Id": get(row, ["Student_Id", "Student ID", "StudentId", "Student_Id "]),
+                "Email_id": get(row, ["Email_id", "Email id", "Email", "Email ID", "Email Address"]),
+                "Course": get(row, ["Course", "Program", "Branch"]),
+                "Code": get(row, ["Code", "Workshop", "Event", "Batch"]),
+            })
+    return students
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "roster.csv")
+        write_roster(path, args.rows)
+        handler = CSVHandler(path)
+
+        if legacy_parse(handler, path) != handler._read_students(path):
+            raise SystemExit("compiled parser output differs from legacy parser")
+
+        legacy = best_of(args.repeat, legacy_parse, handler, path)
+        compiled = best_of(args.repeat, handler._read_students, path)
+
+    print(f"rows:     {args.rows}")
+    print(f"legacy:   {legacy * 1000:9.1f} ms")
+    print(f"compiled: {compiled * 1000:9.1f} ms")
+    print(f"speedup:  {legacy / compiled:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
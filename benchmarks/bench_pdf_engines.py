@@ -0,0 +1,51 @@
+"""
+Side-by-side benchmark of the Pillow (raster) and vector PDF engines
+
+Renders the same names with each engine and reports render time and PDF size.
+Note the vector engine embeds a JPEG template unchanged, so its output size
+tracks the template file size (plus the embedded font subset); the raster
+engine re-encodes every certificate at Pillow's default JPEG quality.
+
+Usage:
+    python -m benchmarks.bench_pdf_engines [--count 50] [--template templates/certificate_template.jpg]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app.certificate_generator import PDF_ENGINES, CertificateGenerator
+from benchmarks.synthetic import make_names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--template", default="templates/certificate_template.jpg")
+    args = parser.parse_args()
+
+    names = make_names(args.count)
+    print(f"template: {args.template} ({os.path.getsize(args.template) / 1024:.0f} KiB)")
+    print(f"{'engine':<8} {'mean ms':>9} {'p95 ms':>9} {'mean KiB':>10}")
+    for engine in PDF_ENGINES:
+        with tempfile.TemporaryDirectory() as out:
+            generator = CertificateGenerator(args.template, output_dir=out, pdf_engine=engine)
+            generator.preload_template()
+            generator.generate_certificate(names[0], "warmup")
+
+            times, sizes = [], []
+            for i, name in enumerate(names):
+                start = time.perf_counter()
+                path = generator.generate_certificate(name, f"CERT-{i}")
+                times.append(time.perf_counter() - start)
+                sizes.append(os.path.getsize(path))
+
+        times.sort()
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        print(f"{engine:<8} {statistics.mean(times) * 1000:9.1f} {p95 * 1000:9.1f} {statistics.mean(sizes) / 1024:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
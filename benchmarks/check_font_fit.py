@@ -0,0 +1,38 @@
+"""
+Check closed-form font fitting against the original 2pt step-down loop
+
+Runs the comparison from tests/test_font_fit.py (also run by pytest) and
+reports the textbbox calls and time each algorithm needs.
+Exits non-zero on any mismatch.
+
+Usage:
+    python -m benchmarks.check_font_fit [--names 400]
+"""
+
+import argparse
+import sys
+
+from tests.test_font_fit import compare, corpus
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--names", type=int, default=400)
+    args = parser.parse_args()
+
+    result = compare(corpus(args.names))
+    for mismatch in result.mismatches:
+        print(f"MISMATCH {mismatch}")
+
+    print(f"cases:            {result.cases}")
+    print(f"mismatches:       {len(result.mismatches)}")
+    print(f"textbbox calls:   legacy {result.legacy_calls}, closed-form {result.fast_calls}")
+    print(
+        f"fit+truncate:     legacy {result.legacy_seconds * 1000:.1f} ms, "
+        f"closed-form {result.fast_seconds * 1000:.1f} ms"
+    )
+    return 1 if result.mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,491 @@
+"""
+End-to-end HTTP load test of app.main:app on a synthetic roster
+
+Starts the app locally (uvicorn or gunicorn, N workers) against a
+generated roster and template, then drives each scenario at a fixed
+concurrency and reports throughput, latency percentiles, error rate and
+the server's CPU and RSS. Everything runs on localhost; no network access
+or real student data is needed.
+
+Scenarios:
+    home              GET /
+    health            GET /health
+    verify_hit        GET /verify for students in the roster
+    verify_miss       GET /verify for unknown students (404)
+    certificate_warm  GET /certificate for already-rendered PDFs
+    certificate_cold  GET /certificate for students never rendered
+    mixed             weighted mix of the above (see MIX)
+
+Usage:
+    python -m benchmarks.loadtest [--server uvicorn|gunicorn] [--workers 2] [--concurrency 32]
+                                  [--duration 15] [--rows 20000] [--scenarios verify_hit,mixed]
+                                  [--env CERT_PDF_ENGINE=vector] [--output load.json]
+
+CPU and RSS are read from /proc (Linux) for the server process and its
+workers. The client is one asyncio process; its own CPU use is reported
+so a saturated client can be told apart from a saturated server.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from benchmarks.synthetic import write_roster, write_template
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("home", "health", "verify_hit", "verify_miss", "certificate_warm", "certificate_cold", "mixed")
+
+# Scenario weights of the "mixed" scenario
+MIX = {
+    "verify_hit": 40,
+    "verify_miss": 10,
+    "certificate_warm": 25,
+    "certificate_cold": 5,
+    "home": 15,
+    "health": 5,
+}
+
+# Students rendered before the run and used by certificate_warm
+WARM_SET = 200
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client connection (GET only)."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def get(self, path: str) -> Tuple[int, int]:
+        """
+        Send a GET and read the whole response
+
+        Args:
+            path: Request target, with query string
+
+        Returns:
+            (status code, body bytes)
+
+        Raises:
+            ConnectionError: If the server closed the connection
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        reader, writer = self._reader, self._writer
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed by server")
+            status = int(status_line.split()[1])
+            headers: Dict[str, str] = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if "content-length" in headers:
+                size = int(headers["content-length"])
+                await reader.readexactly(size)
+            elif headers.get("transfer-encoding", "").lower() == "chunked":
+                size = 0
+                while True:
+                    chunk = int((await reader.readline()).split(b";")[0], 16)
+                    await reader.readexactly(chunk + 2)
+                    size += chunk
+                    if chunk == 0:
+                        break
+            else:
+                size = len(await reader.read())
+                headers["connection"] = "close"
+
+            if headers.get("connection", "").lower() == "close":
+                self.close()
+            return status, size
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class Traffic:
+    """Request paths for each scenario, drawn from the synthetic roster."""
+
+    def __init__(self, rows: List[List[str]], seed: int = 7):
+        self.rows = rows
+        self.rng = random.Random(seed)
+        # Cold students come after the warm set, each used once
+        self._cold = itertools.count(WARM_SET)
+        self.cold_wrapped = False
+        names = list(MIX)
+        self._mix_names, self._mix_weights = names, [MIX[n] for n in names]
+
+    @staticmethod
+    def _student_query(row: List[str]) -> str:
+        return urlencode({"name": row[1], "student_id": row[3]})
+
+    def path(self, scenario: str) -> Tuple[str, bool]:
+        """
+        Next request of a scenario
+
+        Args:
+            scenario: Scenario name
+
+        Returns:
+            (request path, whether a 404 is the expected answer)
+        """
+        if scenario == "mixed":
+            scenario = self.rng.choices(self._mix_names, self._mix_weights)[0]
+        if scenario == "home":
+            return "/", False
+        if scenario == "health":
+            return "/health", False
+        if scenario == "verify_hit":
+            return "/verify?" + self._student_query(self.rng.choice(self.rows)), False
+        if scenario == "verify_miss":
+            return "/verify?" + urlencode({"name": "Nobody Here", "student_id": str(self.rng.randrange(10**9))}), True
+        if scenario == "certificate_warm":
+            index = self.rng.randrange(min(WARM_SET, len(self.rows)))
+            return "/certificate?" + self._student_query(self.rows[index]), False
+        if scenario == "certificate_cold":
+            index = next(self._cold)
+            if index >= len(self.rows):
+                self.cold_wrapped = True
+                index = WARM_SET + index % max(1, len(self.rows) - WARM_SET)
+            return "/certificate?" + self._student_query(self.rows[index]), False
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+
+# /proc sampling
+
+
+def _process_tree(root: int) -> List[int]:
+    """root and all its descendants."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat[stat.rindex(b")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def _cpu_seconds(pids: List[int]) -> float:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                fields = f.read().rsplit(b")", 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])  # utime + stime
+    return total / _CLK_TCK
+
+
+def _rss_bytes(pids: List[int]) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class ServerProcess:
+    """The app under test, started as a subprocess."""
+
+    def __init__(self, server: str, workers: int, port: int, env: Dict[str, str]):
+        if server == "gunicorn":
+            cmd = [
+                sys.executable, "-m", "gunicorn", "app.main:app",
+                "-k", "uvicorn.workers.UvicornWorker", "--preload",
+                "-w", str(workers), "-b", f"127.0.0.1:{port}", "--log-level", "warning",
+            ]
+        else:
+            cmd = [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+            ]
+        self.port = port
+        self.proc = subprocess.Popen(cmd, cwd=PROJECT_ROOT, env={**os.environ, **env}, start_new_session=True)
+
+    async def wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {self.proc.returncode}")
+            conn = HttpConnection("127.0.0.1", self.port)
+            try:
+                status, _ = await conn.get("/health")
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            finally:
+                conn.close()
+            await asyncio.sleep(0.2)
+        raise RuntimeError("server did not become ready")
+
+    def pids(self) -> List[int]:
+        return _process_tree(self.proc.pid) if os.path.isdir("/proc") else []
+
+    def stop(self) -> None:
+        if self.proc.poll() is None:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+            try:
+                self.proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+                self.proc.wait()
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_scenario(
+    server: ServerProcess,
+    traffic: Traffic,
+    scenario: str,
+    concurrency: int,
+    duration: float,
+) -> Dict[str, Any]:
+    """
+    Drive one scenario and collect its statistics
+
+    Args:
+        server: Running app
+        traffic: Path generator
+        scenario: Scenario name
+        concurrency: Simultaneous connections, each sending requests back to back
+        duration: Seconds to run
+
+    Returns:
+        Throughput, latency percentiles, errors and server resource use
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client() -> None:
+        nonlocal errors
+        conn = HttpConnection("127.0.0.1", server.port)
+        try:
+            while time.monotonic() < deadline:
+                path, miss_expected = traffic.path(scenario)
+                start = time.perf_counter()
+                try:
+                    status, _ = await conn.get(path)
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    errors += 1
+                    statuses["error"] = statuses.get("error", 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status >= 400 and not (status == 404 and miss_expected):
+                    errors += 1
+        finally:
+            conn.close()
+
+    peak_rss = 0
+    sampling = True
+
+    async def sample() -> None:
+        nonlocal peak_rss
+        while sampling:
+            peak_rss = max(peak_rss, _rss_bytes(server.pids()))
+            await asyncio.sleep(0.25)
+
+    pids = server.pids()
+    cpu_before = _cpu_seconds(pids)
+    client_cpu_before = time.process_time()
+    wall_start = time.perf_counter()
+
+    sampler = asyncio.create_task(sample())
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_start
+    sampling = False
+    await sampler
+
+    cpu = _cpu_seconds(server.pids()) - cpu_before
+    latencies.sort()
+    total = len(latencies) + statuses.get("error", 0)
+    return {
+        "scenario": scenario,
+        "requests": total,
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "statuses": statuses,
+        "server_cpu_percent": round(cpu / wall * 100, 1),
+        "server_rss_mib": round(_rss_bytes(server.pids()) / 2**20, 1),
+        "server_peak_rss_mib": round(peak_rss / 2**20, 1),
+        "client_cpu_percent": round((time.process_time() - client_cpu_before) / wall * 100, 1),
+    }
+
+
+async def warm_up(server: ServerProcess, traffic: Traffic, concurrency: int) -> None:
+    """Render the warm set and touch every endpoint once."""
+    queue: "asyncio.Queue[str]" = asyncio.Queue()
+    for row in traffic.rows[:WARM_SET]:
+        queue.put_nowait("/certificate?" + traffic._student_query(row))
+    for path in ("/", "/health"):
+        queue.put_nowait(path)
+
+    async def client() -> None:
+        conn = HttpConnection("127.0.0.1", server.port)
+        try:
+            while not queue.empty():
+                await conn.get(queue.get_nowait())
+        finally:
+            conn.close()
+
+    await asyncio.gather(*(client() for _ in range(min(concurrency, 8))))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+    columns = [
+        ("scenario", "scenario", 17), ("req/s", "throughput_rps", 9), ("p50 ms", "p50_ms", 9),
+        ("p95 ms", "p95_ms", 9), ("p99 ms", "p99_ms", 9), ("err %", "error_rate", 7),
+        ("srv cpu%", "server_cpu_percent", 9), ("rss MiB", "server_peak_rss_mib", 9),
+        ("cli cpu%", "client_cpu_percent", 9),
+    ]
+    print("".join(f"{title:>{width}}" if i else f"{title:<{width}}" for i, (title, _, width) in enumerate(columns)))
+    for row in results:
+        cells = []
+        for i, (_, key, width) in enumerate(columns):
+            value = row[key] * 100 if key == "error_rate" else row[key]
+            cells.append(f"{value:<{width}}" if i == 0 else f"{value:>{width}}")
+        print("".join(cells))
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenario(s): {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    with tempfile.TemporaryDirectory(prefix="cert-load-") as tmp:
+        roster = os.path.join(tmp, "roster.csv")
+        rows = write_roster(roster, max(args.rows, WARM_SET + 1))
+        template = write_template(os.path.join(tmp, "template.jpg"))
+        env = {
+            "CSV_PATH": roster,
+            "CERTIFICATE_TEMPLATE_IMAGE": template,
+            "CERTIFICATES_DIR": os.path.join(tmp, "certificates"),
+        }
+        for item in args.env:
+            key, _, value = item.partition("=")
+            env[key] = value
+
+        port = args.port or _free_port()
+        server = ServerProcess(args.server, args.workers, port, env)
+        traffic = Traffic(rows)
+        results: List[Dict[str, Any]] = []
+        try:
+            await server.wait_ready()
+            await warm_up(server, traffic, args.concurrency)
+            for scenario in scenarios:
+                print(f"running {scenario} for {args.duration:g}s at concurrency {args.concurrency}...", flush=True)
+                results.append(await run_scenario(server, traffic, scenario, args.concurrency, args.duration))
+        finally:
+            server.stop()
+
+    print()
+    _print_table(results)
+    if traffic.cold_wrapped:
+        print("\nnote: certificate_cold ran out of unrendered students; raise --rows for a true cold run")
+
+    if args.output:
+        report = {
+            "config": {
+                "server": args.server,
+                "workers": args.workers,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "rows": args.rows,
+                "env": args.env,
+                "cpus": os.cpu_count(),
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    return 1 if any(r["error_rate"] > args.max_error_rate for r in results) else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="simultaneous client connections")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per scenario")
+    parser.add_argument("--rows", type=int, default=20_000, help="synthetic roster size")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated, run in order")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server environment")
+    parser.add_argument("--port", type=int, default=0, help="server port (default: a free one)")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument(
+        "--max-error-rate", type=float, default=0.01, help="exit non-zero if a scenario's error rate is above this"
+    )
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
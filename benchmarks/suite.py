@@ -0,0 +1,314 @@
+"""
+Benchmark suite: roster parsing, lookup, font fitting, rendering and batch throughput
+
+Runs every benchmark against synthetic rosters and templates, writes the
+results as JSON and compares them with a stored baseline. Exits non-zero
+if any result regressed by more than the threshold. Nothing touches the
+network or real student data.
+
+Usage:
+    python -m benchmarks.suite [--sizes 1000,10000,100000] [--output bench.json]
+    python -m benchmarks.suite --sizes 1000,10000,100000,500000    # full roster sweep
+    python -m benchmarks.suite --quick                             # smoke run, no comparison
+    python -m benchmarks.suite --update-baseline                   # store this run as the baseline
+
+Baselines are machine-specific: record one on the machine that runs the
+comparison (e.g. the CI runner) before relying on the threshold. Timings
+are normalized by a CPU calibration loop, but on shared or throttled
+machines raise --threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import PIL
+from PIL import Image, ImageDraw
+
+from app.batch_jobs import BatchJobManager, RenderTask
+from app.certificate_generator import PDF_ENGINES, CertificateGenerator
+from app.csv_handler import CSVHandler, RosterSnapshot
+from benchmarks.synthetic import make_names, write_roster, write_template
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Name lengths (characters) for the font-fitting sweep
+NAME_LENGTHS = (8, 24, 48, 96, 192)
+
+# metric -> {"value", "unit", "better": "lower" | "higher" | "info", "timed": bool}
+Results = Dict[str, Dict[str, Any]]
+
+CALIBRATION = "calibration.cpu"
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def record(results: Results, metric: str, value: float, unit: str, better: str = "lower", timed: bool = True) -> None:
+    results[metric] = {"value": round(value, 6), "unit": unit, "better": better, "timed": timed}
+    print(f"  {metric:<40} {value:14.3f} {unit}")
+
+
+def calibrate(results: Results, repeat: int) -> None:
+    """Time a fixed CPU-bound workload, used to factor out machine speed when comparing."""
+
+    def workload() -> None:
+        table: Dict[str, int] = {}
+        for i in range(200_000):
+            key = f"student-{i % 5000}"
+            table[key] = table.get(key, 0) + len(key.upper())
+
+    print("calibration")
+    record(results, CALIBRATION, best_of(max(5, repeat), workload) * 1000, "ms", better="info")
+
+
+def bench_roster(results: Results, tmp: str, sizes: List[int], repeat: int) -> None:
+    print("roster")
+    for rows in sizes:
+        path = os.path.join(tmp, f"roster-{rows}.csv")
+        data = write_roster(path, rows)
+        handler = CSVHandler(path)
+        record(results, f"roster.parse.{rows}", best_of(repeat, lambda: handler._read_students(path)) * 1000, "ms")
+
+        students = handler._read_students(path)
+        record(
+            results,
+            f"roster.index.{rows}",
+            best_of(repeat, lambda: RosterSnapshot(students, (path, 0, 0))) * 1000,
+            "ms",
+        )
+
+        # Lookups: 90% hits (with case/space noise, like form input), 10% misses
+        snap = RosterSnapshot(students, (path, 0, 0))
+        rng = random.Random(rows)
+        queries: List[Tuple[str, str]] = []
+        for _ in range(20_000):
+            row = rng.choice(data)
+            if rng.random() < 0.9:
+                queries.append((f" {row[1].upper()} ", row[3]))
+            else:
+                queries.append((row[1], str(rng.randrange(10**9))))
+        timings = []
+        for name, student_id in queries:
+            start = time.perf_counter_ns()
+            snap.find(name, student_id)
+            timings.append(time.perf_counter_ns() - start)
+        record(results, f"roster.lookup_p50.{rows}", percentile(timings, 0.50) / 1000, "us")
+        record(results, f"roster.lookup_p99.{rows}", percentile(timings, 0.99) / 1000, "us")
+
+    # normalize_student on the raw dict rows of the largest roster
+    rows = sizes[-1]
+    raw = [
+        {"Name": r[1], "Email id": r[2], "Student Id": r[3], "Course": r[4], "Code": r[5]}
+        for r in write_roster(os.path.join(tmp, "normalize.csv"), min(rows, 50_000))
+    ]
+    handler = CSVHandler(os.path.join(tmp, "normalize.csv"))
+    per_row = best_of(repeat, lambda: [handler.normalize_student(r) for r in raw]) / len(raw)
+    record(results, "roster.normalize_student", per_row * 1e6, "us")
+
+
+def bench_font_fit(results: Results, generator: CertificateGenerator, repeat: int) -> None:
+    print("font fitting (fit + truncate, per name)")
+    plan = generator.render_plan()
+    draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    setattr(draw, "_certificate_generator", generator)
+    words = make_names(400)
+    for length in NAME_LENGTHS:
+        names = []
+        for i in range(50):
+            text = ""
+            j = i
+            while len(text) < length:
+                text += words[j % len(words)] + " "
+                j += 7
+            names.append(text[:length].strip())
+
+        def run() -> None:
+            for name in names:
+                font, bbox = generator._fit_font(
+                    draw, name, max_width=plan.max_text_width, start_size=plan.start_size, min_size=plan.min_size
+                )
+                generator._truncate_to_fit(draw, name, font, plan.max_text_width, bbox=bbox)
+
+        run()  # load the font sizes once
+        record(results, f"font_fit.len{length}", best_of(repeat, run) / len(names) * 1e6, "us")
+
+
+def bench_render(results: Results, tmp: str, templates: Dict[str, str], count: int) -> None:
+    print("render (end to end, per certificate)")
+    names = make_names(count, seed=11)
+    for kind, template in templates.items():
+        for engine in PDF_ENGINES:
+            out = os.path.join(tmp, f"render-{kind}-{engine}")
+            generator = CertificateGenerator(template, output_dir=out, pdf_engine=engine)
+            try:
+                generator.preload_template()
+                generator.generate_certificate(names[0], "warmup")
+            except Exception as e:
+                print(f"  render.{kind}.{engine}: skipped ({e})")
+                continue
+
+            times, sizes = [], []
+            for i, name in enumerate(names):
+                start = time.perf_counter()
+                path = generator.generate_certificate(name, f"CERT-{i}")
+                times.append(time.perf_counter() - start)
+                sizes.append(os.path.getsize(path))
+            record(results, f"render.{kind}.{engine}.median", statistics.median(times) * 1000, "ms")
+            record(results, f"render.{kind}.{engine}.p95", percentile(times, 0.95) * 1000, "ms")
+            record(results, f"render.{kind}.{engine}.pdf_size", statistics.mean(sizes) / 1024, "KiB", timed=False)
+
+
+def bench_generate_all(results: Results, tmp: str, template: str, count: int, workers: Optional[int]) -> None:
+    print("batch generation (the /generate-all job runner)")
+    out = os.path.join(tmp, "generate-all")
+    generator = CertificateGenerator(template, output_dir=out)
+    jobs = BatchJobManager(generator, max_workers=workers)
+    try:
+        # Start the pool and let each worker decode the template before timing.
+        warmup = [jobs.submit_render(RenderTask(f"Warmup {i}", f"WARM-{i}")) for i in range(jobs.max_workers * 2)]
+        wait(warmup)
+
+        names = make_names(count, seed=13)
+        tasks = [RenderTask(name, f"CERT-{i}") for i, name in enumerate(names)]
+        job = jobs.submit(tasks)
+        while not job.finished:
+            time.sleep(0.05)
+        if job.failed:
+            raise RuntimeError(f"batch job failed: {job.failed[0]}")
+        elapsed = job.finished_at - job.started_at
+        record(results, "generate_all.throughput", count / elapsed, "certs/s", better="higher")
+        record(results, "generate_all.workers", jobs.max_workers, "workers", better="info", timed=False)
+    finally:
+        jobs.shutdown()
+
+
+def compare(results: Results, baseline: Results, threshold: float) -> List[str]:
+    """
+    Compare results with a baseline
+
+    Timings are first scaled by the ratio of the two calibration runs, so a
+    uniformly slower or busier machine doesn't read as a regression.
+
+    Args:
+        results: This run
+        baseline: Stored run
+        threshold: Allowed relative change in the "worse" direction
+
+    Returns:
+        Descriptions of the metrics that regressed
+    """
+    speed = 1.0
+    if CALIBRATION in results and baseline.get(CALIBRATION, {}).get("value"):
+        speed = results[CALIBRATION]["value"] / baseline[CALIBRATION]["value"]
+    print(f"\nmachine speed vs baseline: {1 / speed:.2f}x (timings normalized)")
+
+    regressions = []
+    print(f"{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric, current in results.items():
+        base = baseline.get(metric)
+        if base is None or current["better"] == "info" or not base["value"]:
+            continue
+        expected = base["value"]
+        if current.get("timed", True):
+            expected = expected * speed if current["better"] == "lower" else expected / speed
+        change = current["value"] / expected - 1
+        worse = change > threshold if current["better"] == "lower" else change < -threshold
+        flag = "  REGRESSION" if worse else ""
+        print(f"{metric:<40} {expected:12.3f} {current['value']:12.3f} {change:+8.1%}{flag}")
+        if worse:
+            regressions.append(f"{metric}: {expected:.3f} -> {current['value']:.3f} {current['unit']} ({change:+.1%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated roster sizes (rows)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions; the best is kept")
+    parser.add_argument("--renders", type=int, default=30, help="certificates per template/engine")
+    parser.add_argument("--batch", type=int, default=200, help="certificates in the batch throughput run")
+    parser.add_argument("--workers", type=int, default=None, help="batch pool size (default: BATCH_WORKERS / CPUs)")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, e.g. 0.25 = 25%%")
+    parser.add_argument("--update-baseline", action="store_true", help="save this run as the baseline")
+    parser.add_argument("--quick", action="store_true", help="tiny sizes, no baseline comparison")
+    args = parser.parse_args()
+
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    if args.quick:
+        sizes, args.repeat, args.renders, args.batch = [1000], 1, 3, 8
+
+    results: Results = {}
+    with tempfile.TemporaryDirectory(prefix="cert-bench-") as tmp:
+        templates = {
+            "jpeg": write_template(os.path.join(tmp, "template.jpg")),
+            "png_rgba": write_template(os.path.join(tmp, "template.png")),
+        }
+        calibrate(results, args.repeat)
+        bench_roster(results, tmp, sizes, args.repeat)
+        bench_font_fit(results, CertificateGenerator(templates["jpeg"], output_dir=None), args.repeat)
+        bench_render(results, tmp, templates, args.renders)
+        bench_generate_all(results, tmp, templates["jpeg"], args.batch, args.workers)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "update_baseline")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if args.quick:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get("results", {}), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nno regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Synthetic fixtures for benchmarks
+
+Generates Google-Forms style rosters (same header layout as students.csv)
+so benchmarks never depend on real student data.
+"""
+
+import csv
+import random
+from typing import List, Optional, Tuple
+
+FIRST_NAMES = [
+    "Aditya", "Sarthak", "Saksham", "Priya", "Ananya", "Rohan", "Ishita", "Kabir",
+    "Meera", "Arjun", "Diya", "Vihaan", "Sneha", "Aarav", "Nisha", "Karan",
+]
+LAST_NAMES = [
+    "Singh", "Raiwani", "Joshi", "Venkateshbabu", "Sharma", "Gupta", "Iyer",
+    "Chatterjee", "Reddy", "Nair", "Mehta", "Kulkarni", "Bhattacharya",
+]
+UNICODE_NAMES = [
+    "Zoë Ångström", "José Núñez", "Łukasz Żółć", "Søren Kierkegård",
+    "Dvořák Antonín", "Þórunn Ægisdóttir", "François Lefèvre",
+]
+COURSES = ["BTech", "BCA", "MCA", "MTech", "BSc"]
+
+HEADER = ["Timestamp", "Name", "Email id", "Student Id", "Course", "Code"]
+
+
+def make_name(rng: random.Random) -> str:
+    """Return a realistic name; ~5% Unicode, ~2% very long."""
+    roll = rng.random()
+    if roll < 0.05:
+        return rng.choice(UNICODE_NAMES)
+    if roll < 0.07:
+        parts = [rng.choice(FIRST_NAMES)] + [rng.choice(LAST_NAMES) for _ in range(rng.randint(4, 8))]
+        return " ".join(parts)
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def make_names(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    return [make_name(rng) for _ in range(count)]
+
+
+def write_roster(path: str, rows: int, seed: int = 7, code: Optional[str] = "WORKSHOP1") -> List[List[str]]:
+    """
+    Write a synthetic roster CSV
+
+    Args:
+        path: Destination CSV path
+        rows: Number of student rows
+        seed: RNG seed, so runs are reproducible
+        code: Event code for every row
+
+    Returns:
+        The data rows that were written (without the header)
+    """
+    rng = random.Random(seed)
+    data: List[List[str]] = []
+    for i in range(rows):
+        name = make_name(rng)
+        student_id = str(24000000 + i)
+        email = f"{name.split()[0].lower()}{i}@example.com"
+        data.append([f"1/24/2026 12:{i // 60 % 60:02d}:{i % 60:02d}", name, email, student_id, rng.choice(COURSES), code or ""])
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(data)
+    return data
+
+
+def write_template(path: str, size: Tuple[int, int] = (2000, 1414), seed: int = 7) -> str:
+    """
+    Write a synthetic certificate template
+
+    A gradient with a border and some noise, so JPEG/PNG encoders do
+    realistic work. The format follows the extension: `.jpg` gives an RGB
+    JPEG, `.png` an RGBA PNG (which exercises the alpha composite path).
+
+    Args:
+        path: Destination image path
+        size: (width, height) in pixels
+        seed: RNG seed for the noise
+
+    Returns:
+        path
+    """
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    img = Image.merge("RGB", (gradient, Image.new("L", size, 230), gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    noise = Image.effect_noise(size, 24).convert("RGB")
+    img = Image.blend(img, noise, 0.15)
+
+    draw = ImageDraw.Draw(img)
+    rng = random.Random(seed)
+    border = max(4, width // 100)
+    draw.rectangle((border, border, width - border, height - border), outline=(120, 90, 30), width=border)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.ellipse((x, y, x + width // 20, y + width // 20), outline=(rng.randrange(256), 80, 160), width=3)
+
+    if path.lower().endswith(".png"):
+        img.convert("RGBA").save(path, "PNG")
+    else:
+        img.save(path, "JPEG", quality=90)
+    return path
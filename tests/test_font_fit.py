@@ -0,0 +1,115 @@
+"""
+Closed-form font fitting vs the original 2pt step-down loop
+
+The comparison runs a corpus of names over several start sizes and widths
+and checks that both pick the same font size and truncated text.
+benchmarks/check_font_fit.py reuses it to report textbbox calls and timings.
+"""
+
+import time
+from typing import List, NamedTuple, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+from app.certificate_generator import CertificateGenerator
+from benchmarks.synthetic import make_names
+
+# (start_size, min_size, max_width)
+CONFIGS: List[Tuple[int, int, int]] = [
+    (120, 14, 1216), (120, 14, 600), (96, 14, 1216), (73, 14, 900), (120, 60, 1216), (40, 14, 300),
+]
+
+
+class CountingDraw:
+    """ImageDraw proxy that counts textbbox calls."""
+
+    def __init__(self, draw: ImageDraw.ImageDraw, generator: CertificateGenerator):
+        self._draw = draw
+        self._certificate_generator = generator
+        self.calls = 0
+
+    def textbbox(self, *args, **kwargs):
+        self.calls += 1
+        return self._draw.textbbox(*args, **kwargs)
+
+
+class FitComparison(NamedTuple):
+    """Outcome of compare()."""
+
+    cases: int
+    mismatches: List[str]
+    legacy_calls: int
+    fast_calls: int
+    legacy_seconds: float
+    fast_seconds: float
+
+
+def legacy_fit(draw, text: str, *, max_width: int, start_size: int, min_size: int):
+    """The original step-down loop."""
+    generator = draw._certificate_generator
+    size = start_size
+    while size >= min_size:
+        font = generator._load_font(size)
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        if right - left <= max_width:
+            return font
+        size -= 2
+    return generator._load_font(min_size)
+
+
+def corpus(count: int = 400) -> List[str]:
+    """Synthetic names plus length sweeps of wide and narrow glyphs."""
+    names = make_names(count)
+    # Length sweep from a single letter up to ~200 characters.
+    word = "Bhattacharya Venkateshbabu "
+    names += [(word * 8)[:n].strip() or "A" for n in range(1, 200, 3)]
+    names += ["W" * n for n in range(1, 80, 5)] + ["i" * n for n in range(1, 200, 9)]
+    return names
+
+
+def compare(names: Sequence[str], configs: Sequence[Tuple[int, int, int]] = CONFIGS) -> FitComparison:
+    """
+    Fit every name with both algorithms under every config
+
+    Args:
+        names: Names to fit
+        configs: (start_size, min_size, max_width) settings to try
+
+    Returns:
+        Mismatch descriptions, textbbox call counts and fit+truncate time per algorithm
+    """
+    generator = CertificateGenerator(output_dir=None)
+    draw = CountingDraw(ImageDraw.Draw(Image.new("RGBA", (1, 1))), generator)
+
+    mismatches: List[str] = []
+    legacy_calls = fast_calls = 0
+    legacy_seconds = fast_seconds = 0.0
+    for start_size, min_size, max_width in configs:
+        for name in names:
+            kwargs = dict(max_width=max_width, start_size=start_size, min_size=min_size)
+
+            draw.calls = 0
+            t = time.perf_counter()
+            old_font = legacy_fit(draw, name, **kwargs)
+            old_text = generator._truncate_to_fit(draw, name, old_font, max_width)
+            legacy_seconds += time.perf_counter() - t
+            legacy_calls += draw.calls
+
+            draw.calls = 0
+            t = time.perf_counter()
+            new_font, bbox = generator._fit_font(draw, name, **kwargs)
+            new_text = generator._truncate_to_fit(draw, name, new_font, max_width, bbox=bbox)
+            fast_seconds += time.perf_counter() - t
+            fast_calls += draw.calls
+
+            if (old_font.size, old_text) != (new_font.size, new_text):
+                mismatches.append(f"{kwargs} {name!r}: {old_font.size} vs {new_font.size}")
+
+    return FitComparison(len(names) * len(configs), mismatches, legacy_calls, fast_calls, legacy_seconds, fast_seconds)
+
+
+def test_closed_form_fit_matches_legacy_loop():
+    # The length sweeps cover the edge cases; fewer synthetic names keep it quick.
+    result = compare(corpus(100))
+    assert result.mismatches == []
+    assert result.fast_calls < result.legacy_calls